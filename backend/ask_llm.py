@@ -1,13 +1,14 @@
+import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from llm_pool import pool, NoBackendAvailable
+from llm_scheduler import scheduler, request_key, Overloaded, INTERACTIVE
 from utilities import encode_image, string_to_json
 
 
-prompt = """
-    You are a fashion tagging assistant. 
-    Analyze the clothing item in this image and respond ONLY in JSON with the following fields:
-    
-    IMPORTANT: Your response must be valid JSON and nothing else. Do not include any markdown formatting or additional text.
-    
+# Fields and definitions of one item's tags, shared by the single-image
+# and batch prompts.
+tag_schema = """
     {
         "category": "",               
         "sub_category": "",           
@@ -35,10 +36,43 @@ prompt = """
     - body_part: upper, lower, footwear, outerwear, accessory.
     """
 
-local_url = "http://127.0.0.1:8034/v1/chat/completions"
+prompt = """
+    You are a fashion tagging assistant. 
+    Analyze the clothing item in this image and respond ONLY in JSON with the following fields:
+    
+    IMPORTANT: Your response must be valid JSON and nothing else. Do not include any markdown formatting or additional text.
+    """ + tag_schema
+
+# Set in jobs.py worker processes: their LLM calls go through the API
+# process so that one scheduler admits every call against the backends.
+LLM_GATEWAY_URL = os.getenv("LLM_GATEWAY_URL")
 
+def _gateway_chat(data, kind, priority):
+    response = requests.post(
+        f"{LLM_GATEWAY_URL.rstrip('/')}/internal/llm/chat",
+        json={"payload": data, "kind": kind, "priority": priority},
+        headers={"X-Admin-Token": os.getenv("ADMIN_TOKEN", "")},
+        timeout=scheduler.timeouts[priority] + 600
+    )
+    retry_after = int(response.headers.get("Retry-After", "5"))
+    if response.status_code == 429:
+        raise Overloaded(response.json().get("detail", "LLM overloaded"), retry_after=retry_after)
+    if response.status_code == 503:
+        raise NoBackendAvailable(response.json().get("detail", "No LLM backend available"), retry_after=retry_after)
+    response.raise_for_status()
+    return response.json()
 
-def analyze_clothing(img_path):
+def chat(data, kind="text", priority=INTERACTIVE):
+    """Send a chat request through the scheduler, coalescing identical calls."""
+    if LLM_GATEWAY_URL:
+        return _gateway_chat(data, kind, priority)
+    return scheduler.run(
+        lambda: pool.chat(data, kind=kind),
+        priority=priority,
+        key=request_key(data, kind)
+    )
+
+def analyze_clothing(img_path, priority=INTERACTIVE):
     img_b64 = encode_image(img_path)
     print("analyzing clothing.....")
     data = {
@@ -64,19 +98,94 @@ def analyze_clothing(img_path):
         ],
     }
 
-    response = requests.post(local_url, json=data)
-    text = response.json()["choices"][0]["message"]["content"]
+    response = chat(data, kind="vision", priority=priority)
+    text = response["choices"][0]["message"]["content"]
     json_response = string_to_json(text)
     return json_response
 
-def score_outfit(outfit, occasion, weather, style_pref):
+batch_prompt = """
+    You are a fashion tagging assistant.
+    The images below each show one clothing item, numbered in order.
+    Respond ONLY with a JSON array containing exactly {count} objects, one per
+    image, in the same order as the images.
+
+    IMPORTANT: Your response must be a valid JSON array and nothing else. Do not include any markdown formatting or additional text.
+
+    Each object in the array has the following fields:
+    """
+
+def analyze_clothing_batch(img_paths, priority=INTERACTIVE):
+    """
+    Tag several clothing images with a single multi-image vision request.
+
+    Falls back to one concurrent request per image when the model does not
+    return exactly one result per image.
+
+    Returns:
+        list: One metadata dict per image, in the order of img_paths
+    """
+    if len(img_paths) == 1:
+        return [analyze_clothing(img_paths[0], priority=priority)]
+
+    content = [{"type": "text", "text": batch_prompt.format(count=len(img_paths)) + tag_schema}]
+    for i, img_path in enumerate(img_paths):
+        content.append({"type": "text", "text": f"Image {i + 1}:"})
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{encode_image(img_path)}",
+                "detail": "high"
+            }
+        })
+
+    data = {
+        "model": "Qwen3-VL-4B-Instruct-GGUF:Q4_K_M",
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that extracts structured metadata from clothing images. Respond ONLY with valid JSON that matches the required schema."
+            },
+            {"role": "user", "content": content}
+        ],
+    }
+
+    print(f"analyzing {len(img_paths)} clothing items in one request.....")
+    try:
+        response = chat(data, kind="vision", priority=priority)
+        results = string_to_json(response["choices"][0]["message"]["content"])
+    except (Overloaded, NoBackendAvailable):
+        raise
+    except Exception as e:
+        print(f"Batch tagging failed, tagging images separately: {str(e)}")
+        results = None
+
+    if isinstance(results, list) and len(results) == len(img_paths) and all(isinstance(r, dict) for r in results):
+        return results
+
+    with ThreadPoolExecutor(max_workers=len(img_paths)) as executor:
+        return list(executor.map(lambda p: analyze_clothing(p, priority=priority), img_paths))
+
+slot_labels = {
+    "top": "Top",
+    "bottom": "Bottom",
+    "shoes": "Footwear",
+    "outerwear": "Outerwear",
+}
+
+def describe_outfit(outfit):
+    lines = []
+    for slot, label in slot_labels.items():
+        item = outfit.get(slot)
+        if item:
+            lines.append(f"{label}: {item['description']}")
+    return "\n    ".join(lines)
+
+def score_outfit(outfit, occasion, weather, style_pref, priority=INTERACTIVE):
     prompt = f"""
     Rate this outfit for the given scenario.
 
     Outfit:
-    Top: {outfit['top']['description']}
-    Bottom: {outfit['bottom']['description']}
-    Footwear: {outfit['shoes']['description']}
+    {describe_outfit(outfit)}
 
     Occasion: {occasion}
     Weather: {weather}
@@ -84,7 +193,6 @@ def score_outfit(outfit, occasion, weather, style_pref):
 
     Return ONLY JSON with:
     {{
-      "color_harmony": int (1-10),
       "occasion_fit": int (1-10),
       "style_alignment": int (1-10),
       "weather_suitability": int (1-10),
@@ -101,17 +209,37 @@ def score_outfit(outfit, occasion, weather, style_pref):
         "logprobs": 1
     }
 
-    response = requests.post(local_url, json=data)
+    response = chat(data, kind="text", priority=priority)
 
-    text = response.json()["choices"][0]["message"]["content"]
+    text = response["choices"][0]["message"]["content"]
     json_response = string_to_json(text)
     return json_response
 
-def explain_outfit(outfit):
+explain_fields = ["category", "sub_category", "primary_color", "secondary_color",
+                  "pattern", "formality_level", "style_tags"]
+
+def compact_outfit(outfit):
+    """Only the fields an explanation needs, one line per filled slot."""
+    lines = []
+    for slot, label in slot_labels.items():
+        item = outfit.get(slot)
+        if not item:
+            continue
+        fields = []
+        for field in explain_fields:
+            value = item.get(field)
+            if isinstance(value, list):
+                value = ", ".join(str(v) for v in value)
+            if value not in (None, ""):
+                fields.append(f"{field}={value}")
+        lines.append(f"{label}: {'; '.join(fields)}")
+    return "\n    ".join(lines)
+
+def explanation_request(outfit):
     prompt = f"""
     Create a friendly stylist explanation for this outfit:
 
-    {outfit}
+    {compact_outfit(outfit)}
 
     Include:
     - Why it works
@@ -120,19 +248,29 @@ def explain_outfit(outfit):
     - One optional alternative suggestion
     """
 
-    data = {
+    return {
         "model": "Qwen3-VL-4B-Instruct-GGUF:Q4_K_M",
         "messages": [
             {"role": "user", "content": prompt}
-        ],
-        "logprobs": 1
+        ]
     }
 
-    response = requests.post(local_url, json=data)
+def stream_explanation(outfit, priority=INTERACTIVE):
+    """Yield the stylist explanation for an outfit token by token."""
+    data = explanation_request(outfit)
+    chunks = scheduler.stream(
+        lambda: pool.stream("/v1/chat/completions", data, kind="text"),
+        priority=priority
+    )
+    for chunk in chunks:
+        choices = chunk.get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
 
-    text = response.json()["choices"][0]["message"]["content"]
-    json_response = string_to_json(text)
-    return json_response
+def explain_outfit(outfit, priority=INTERACTIVE):
+    response = chat(explanation_request(outfit), kind="text", priority=priority)
+    return response["choices"][0]["message"]["content"]
 
 def extract_style_preferences(query: str) -> dict:
     """
@@ -151,9 +289,8 @@ def extract_style_preferences(query: str) -> dict:
     """
 
     try:
-        response = requests.post(
-            local_url,
-            json={
+        result = chat(
+            {
                 "model": "Qwen3-VL-4B-Instruct-GGUF:Q4_K_M",
                 "messages": [
                     {
@@ -166,13 +303,15 @@ def extract_style_preferences(query: str) -> dict:
                     }
                 ],
                 "temperature": 0.1
-            }
+            },
+            kind="text"
         )
         
-        result = response.json()
         content = result["choices"][0]["message"]["content"]
         return string_to_json(content)
         
+    except (Overloaded, NoBackendAvailable):
+        raise
     except Exception as e:
         print(f"Error extracting style preferences: {str(e)}")
         return {
@@ -0,0 +1,250 @@
+import numpy as np
+from PIL import Image
+
+# Palette entries with chroma below this are treated as neutrals
+# (black, white, grey, beige), which go with anything.
+NEUTRAL_CHROMA = 15.0
+
+# A palette color is named as the secondary color only if it covers at
+# least this share of the garment and is at least this far (Lab distance)
+# from the primary color; shading and small prints stay unnamed.
+SECONDARY_MIN_WEIGHT = 0.15
+SECONDARY_MIN_DISTANCE = 20.0
+
+named_colors = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "grey": (128, 128, 128),
+    "navy": (25, 35, 100),
+    "blue": (30, 90, 200),
+    "light blue": (150, 190, 230),
+    "teal": (0, 128, 128),
+    "green": (40, 140, 60),
+    "olive": (110, 110, 40),
+    "yellow": (240, 210, 50),
+    "mustard": (200, 160, 40),
+    "orange": (240, 130, 30),
+    "red": (200, 30, 40),
+    "maroon": (120, 20, 40),
+    "pink": (240, 160, 190),
+    "purple": (110, 50, 150),
+    "brown": (110, 70, 40),
+    "beige": (220, 200, 170),
+}
+
+
+def rgb_to_lab(rgb):
+    """Convert an (..., 3) array of sRGB values in 0-255 to CIE Lab (D65)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    m = np.array([
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ])
+    xyz = c @ m.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+_named_lab = rgb_to_lab(np.array(list(named_colors.values())))
+_named = list(named_colors)
+
+
+def color_name(lab):
+    return _named[int(np.argmin(((_named_lab - np.asarray(lab)) ** 2).sum(axis=1)))]
+
+
+def _kmeans(points, k, iterations=12, seed=0):
+    rng = np.random.default_rng(seed)
+    # k-means++ seeding keeps the result stable across runs.
+    centers = [points[rng.integers(len(points))]]
+    for _ in range(1, k):
+        dist = np.min(((points[:, None, :] - np.array(centers)[None]) ** 2).sum(-1), axis=1)
+        if dist.sum() == 0:
+            break
+        centers.append(points[rng.choice(len(points), p=dist / dist.sum())])
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = np.argmin(((points[:, None, :] - centers[None]) ** 2).sum(-1), axis=1)
+        updated = np.array([
+            points[labels == i].mean(axis=0) if np.any(labels == i) else centers[i]
+            for i in range(len(centers))
+        ])
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+    labels = np.argmin(((points[:, None, :] - centers[None]) ** 2).sum(-1), axis=1)
+    return centers, np.bincount(labels, minlength=len(centers))
+
+
+def extract_palette(img_path, k=3, size=96, crop=0.8):
+    """
+    Dominant garment colors of an image, computed locally.
+
+    The image is downscaled and center-cropped. Pixels close to the
+    background color (estimated from the border) are masked out. The rest
+    are clustered with k-means in Lab space.
+
+    Returns:
+        list: Up to k colors, largest first, each with "lab", "rgb", "hex",
+        "name" and "weight" (share of garment pixels)
+    """
+    with Image.open(img_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        rgb = np.asarray(img, dtype=np.float64)
+
+    lab = rgb_to_lab(rgb)
+    border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+    background = np.median(border, axis=0)
+
+    h, w = lab.shape[:2]
+    dy, dx = int(h * (1 - crop) / 2), int(w * (1 - crop) / 2)
+    lab = lab[dy:h - dy, dx:w - dx].reshape(-1, 3)
+    rgb = rgb[dy:h - dy, dx:w - dx].reshape(-1, 3)
+
+    mask = np.sqrt(((lab - background) ** 2).sum(axis=1)) > 12
+    if mask.mean() > 0.1:
+        lab, rgb = lab[mask], rgb[mask]
+
+    centers, counts = _kmeans(lab, min(k, len(lab)))
+    labels = np.argmin(((lab[:, None, :] - centers[None]) ** 2).sum(-1), axis=1)
+    palette = []
+    for i in np.argsort(-counts):
+        if counts[i] == 0:
+            continue
+        # Report the mean sRGB of the cluster's pixels rather than converting back.
+        mean_rgb = rgb[labels == i].mean(axis=0).round().astype(int)
+        palette.append({
+            "lab": [round(float(v), 2) for v in centers[i]],
+            "rgb": [int(v) for v in mean_rgb],
+            "hex": "#{:02x}{:02x}{:02x}".format(*mean_rgb),
+            "name": color_name(centers[i]),
+            "weight": round(float(counts[i] / counts.sum()), 4),
+        })
+    return palette
+
+
+def apply_palette(metadata, palette):
+    """Store a palette on item metadata and name its colors from the pixels."""
+    metadata["palette"] = palette
+    if palette:
+        primary = palette[0]
+        metadata["primary_color"] = primary["name"]
+        others = [
+            c["name"] for c in palette[1:]
+            if c["weight"] >= SECONDARY_MIN_WEIGHT
+            and c["name"] != primary["name"]
+            and np.linalg.norm(np.subtract(c["lab"], primary["lab"])) >= SECONDARY_MIN_DISTANCE
+        ]
+        metadata["secondary_color"] = others[0] if others else ""
+    return metadata
+
+
+def _palette_arrays(items, k=3):
+    """Stack item palettes into (n, k, 3) Lab and (n, k) weight arrays."""
+    labs = np.zeros((len(items), k, 3), dtype=np.float32)
+    weights = np.zeros((len(items), k), dtype=np.float32)
+    for row, item in enumerate(items):
+        for col, color in enumerate((item.get("palette") or [])[:k]):
+            labs[row, col] = color["lab"]
+            weights[row, col] = color["weight"]
+    return labs, weights
+
+
+def _hue_score(diff):
+    if diff <= 30:
+        return 0.9  # analogous
+    if diff >= 150:
+        return 0.85  # complementary
+    if abs(diff - 120) <= 15:
+        return 0.75  # triadic
+    return 0.4
+
+
+# Harmony by whole-degree hue difference, 0-180.
+_hue_scores = np.array([_hue_score(d) for d in range(181)], dtype=np.float32)
+
+
+def _pair_harmony(labs_a, labs_b):
+    """Harmony in [0, 1] of every color in labs_a (m, 3) with every color in labs_b (n, 3)."""
+    labs_a = labs_a.astype(np.float32)
+    labs_b = labs_b.astype(np.float32)
+    hue_a = np.degrees(np.arctan2(labs_a[:, 2], labs_a[:, 1]))
+    hue_b = np.degrees(np.arctan2(labs_b[:, 2], labs_b[:, 1]))
+    diff = np.abs(hue_a[:, None] - hue_b[None, :])
+    diff = np.minimum(diff, 360 - diff)
+    score = _hue_scores[np.rint(diff).astype(np.int16)]
+
+    # Clashing hues read better with a clear lightness contrast.
+    contrast = np.minimum(np.abs(labs_a[:, 0, None] - labs_b[None, :, 0]) * (1 / 50.0), 1.0)
+    score = score + (score < 0.75) * (0.2 * contrast)
+
+    neutral = np.logical_or.outer(
+        np.hypot(labs_a[:, 1], labs_a[:, 2]) < NEUTRAL_CHROMA,
+        np.hypot(labs_b[:, 1], labs_b[:, 2]) < NEUTRAL_CHROMA,
+    )
+    return np.where(neutral, np.float32(0.85), score)
+
+
+def harmony_table(items_a, items_b, neutral=0.5):
+    """
+    Color harmony of every item in items_a with every item in items_b, as a
+    len(items_a) x len(items_b) array. Each palette pair is scored by hue
+    relationship (analogous, complementary, triadic or clashing), with
+    neutrals matching anything, and weighted by both colors' shares.
+    Pairs where either item has no palette get the neutral value.
+    """
+    labs_a, w_a = _palette_arrays(items_a)
+    labs_b, w_b = _palette_arrays(items_b)
+    na, k = w_a.shape
+    nb = len(w_b)
+    if not w_a.any() or not w_b.any():
+        return np.full((na, nb), neutral, dtype=np.float32)
+
+    # Score all colors against all colors as one 2-D matrix, then fold the
+    # k x k blocks back into per-item-pair weighted means.
+    pair = _pair_harmony(labs_a.reshape(-1, 3), labs_b.reshape(-1, 3))
+    weighted = np.einsum("ikjl,ik,jl->ij", pair.reshape(na, k, nb, k), w_a, w_b, optimize=True)
+    total = np.outer(w_a.sum(axis=1), w_b.sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table = np.where(total > 0, weighted / total, neutral)
+    return table.astype(np.float32)
+
+
+def outfit_harmony(outfit, slots=("top", "bottom", "shoes", "outerwear")):
+    """Mean color harmony over every pair of filled slots that have palettes."""
+    items = [outfit[s] for s in slots if outfit.get(s) and outfit[s].get("palette")]
+    if len(items) < 2:
+        return None
+    table = harmony_table(items, items)
+    pairs = [table[i, j] for i in range(len(items)) for j in range(i + 1, len(items))]
+    return round(float(np.mean(pairs)), 4)
+
+
+def backfill_palettes():
+    """Compute palettes for items saved before color extraction existed."""
+    from database import clothes, update_item_in_db
+    from image_store import store
+
+    updated = 0
+    for item in clothes.find({"palette": {"$exists": False}}, {"image_path": 1}):
+        try:
+            palette = extract_palette(store.local_path(item["image_path"]))
+        except Exception as e:
+            print(f"Error extracting palette for {item['_id']}: {str(e)}")
+            continue
+        update_item_in_db(item["_id"], {"palette": palette})
+        updated += 1
+    print(f"Added palettes to {updated} items")
+    return updated
+
+
+if __name__ == "__main__":
+    backfill_palettes()
@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from dotenv import load_dotenv
 import os
 
@@ -9,6 +9,23 @@ mongo_uri = os.getenv("MONGO_URI")
 client = MongoClient(mongo_uri)
 db = client["personal-stylist"]
 clothes = db["clothes_local"]
+meta = db["meta"]
+recommendations = db["recommendations"]
+
+
+def get_wardrobe_version():
+    doc = meta.find_one({"_id": "wardrobe_version"})
+    return doc["value"] if doc else 0
+
+def bump_wardrobe_version():
+    """Increment the wardrobe version. Called on every item insert, update and delete."""
+    doc = meta.find_one_and_update(
+        {"_id": "wardrobe_version"},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["value"]
 
 
 def save_item_to_db(id, item):
@@ -28,10 +45,31 @@ def save_item_to_db(id, item):
         "body_part": item["body_part"],
         "description": item["description"],
     }
+    if item.get("palette"):
+        entry["palette"] = item["palette"]
 
     clothes.insert_one(entry)
+    bump_wardrobe_version()
     print(f"Saved: {item["image_path"]}")
 
+def update_item_in_db(id, fields):
+    result = clothes.update_one({"_id": id}, {"$set": fields})
+    if result.matched_count:
+        bump_wardrobe_version()
+    return result.matched_count > 0
+
+def delete_item_from_db(id):
+    result = clothes.delete_one({"_id": id})
+    if result.deleted_count:
+        bump_wardrobe_version()
+    return result.deleted_count > 0
+
 def get_items_by_id(hits):
-    items = [clothes.find_one({"_id": hit["id"]}) for hit in hits]
-    return items
\ No newline at end of file
+    by_id = get_items_by_ids([hit["id"] for hit in hits])
+    return [by_id.get(hit["id"]) for hit in hits]
+
+def get_items_by_ids(ids):
+    """Fetch several items in one round trip. Returns a dict keyed by _id."""
+    if not ids:
+        return {}
+    return {item["_id"]: item for item in clothes.find({"_id": {"$in": list(set(ids))}})}
\ No newline at end of file
@@ -0,0 +1,78 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from outfit_search import outfit_id
+from ask_llm import stream_explanation
+
+
+class ExplanationCache:
+    """
+    Finished explanations per outfit id and item contents, least recently
+    used evicted first.
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, text):
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def drop_item(self, item_id):
+        """Drop every explanation of an outfit that includes the item."""
+        with self.lock:
+            for key in [k for k in self.entries if item_id in k.split(":")[0].split("_")]:
+                del self.entries[key]
+
+
+cache = ExplanationCache()
+
+
+def cache_key(outfit):
+    """
+    The outfit id plus a digest of its items, so an explanation is never
+    served for an item that was edited after it was written, including by
+    another process.
+    """
+    items = [outfit[slot] for slot in sorted(outfit) if outfit[slot]]
+    digest = hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{outfit_id(outfit)}:{digest}"
+
+
+def sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def explanation_events(outfit):
+    """
+    Server-sent events for an outfit's explanation. A cached explanation is
+    sent as a single event; otherwise tokens are streamed as the model
+    produces them and the full text is cached once the stream completes.
+    """
+    key = cache_key(outfit)
+    cached = cache.get(key)
+    if cached is not None:
+        yield sse({"delta": cached})
+        yield sse({"outfit_id": outfit_id(outfit), "cached": True}, event="done")
+        return
+
+    parts = []
+    for delta in stream_explanation(outfit):
+        parts.append(delta)
+        yield sse({"delta": delta})
+    cache.put(key, "".join(parts))
+    yield sse({"outfit_id": outfit_id(outfit), "cached": False}, event="done")
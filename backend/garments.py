@@ -0,0 +1,126 @@
+import io
+from collections import deque
+import numpy as np
+from PIL import Image
+from colors import rgb_to_lab
+
+
+def _foreground_mask(lab, threshold=14.0):
+    """Pixels that differ from the background color estimated at the border."""
+    border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+    background = np.median(border, axis=0)
+    return np.sqrt(((lab - background) ** 2).sum(axis=-1)) > threshold
+
+
+def _shift_any(mask, radius):
+    """True where any pixel within radius is True (binary dilation)."""
+    h, w = mask.shape
+    padded = np.pad(mask, radius)
+    out = np.zeros_like(mask)
+    for dy in range(2 * radius + 1):
+        for dx in range(2 * radius + 1):
+            out |= padded[dy:dy + h, dx:dx + w]
+    return out
+
+
+def _close(mask, radius=1):
+    """Morphological closing: fill pinholes and thin gaps inside a garment."""
+    dilated = _shift_any(mask, radius)
+    return ~_shift_any(~dilated, radius)
+
+
+def _components(mask):
+    """Bounding boxes and pixel counts of 4-connected regions of mask."""
+    h, w = mask.shape
+    seen = np.zeros_like(mask)
+    regions = []
+    for y, x in zip(*np.nonzero(mask)):
+        if seen[y, x]:
+            continue
+        seen[y, x] = True
+        queue = deque([(y, x)])
+        y0, y1, x0, x1, area = y, y, x, x, 0
+        while queue:
+            cy, cx = queue.popleft()
+            area += 1
+            y0, y1, x0, x1 = min(y0, cy), max(y1, cy), min(x0, cx), max(x1, cx)
+            for ny, nx in ((cy - 1, cx), (cy + 1, cx), (cy, cx - 1), (cy, cx + 1)):
+                if 0 <= ny < h and 0 <= nx < w and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    queue.append((ny, nx))
+        regions.append(((x0, y0, x1 + 1, y1 + 1), area))
+    return regions
+
+
+def _overlap(a, b):
+    """Intersection area over the smaller box's area."""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return ix * iy / smaller if smaller else 0.0
+
+
+def _merge(boxes, threshold=0.6):
+    merged = []
+    for box in sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True):
+        for i, other in enumerate(merged):
+            if _overlap(box, other) >= threshold:
+                merged[i] = (min(box[0], other[0]), min(box[1], other[1]),
+                             max(box[2], other[2]), max(box[3], other[3]))
+                break
+        else:
+            merged.append(box)
+    return merged
+
+
+def detect_garments(img_path, size=160, min_area=0.02, max_garments=8, pad=0.04):
+    """
+    Find separate garments in a flat-lay or multi-item photo, on the CPU.
+
+    The image is downscaled. Pixels that stand out from the border-estimated
+    background are grouped into connected regions, and regions too small to
+    be a garment are dropped. Overlapping boxes are merged.
+
+    Returns:
+        list: (left, top, right, bottom) boxes in original image pixels,
+        largest first. A photo with a single garment, or where no garment
+        can be separated from the background, yields one box.
+    """
+    with Image.open(img_path) as img:
+        img = img.convert("RGB")
+        width, height = img.size
+        small = img.copy()
+        small.thumbnail((size, size))
+
+    lab = rgb_to_lab(np.asarray(small, dtype=np.float64))
+    mask = _close(_foreground_mask(lab))
+    sh, sw = mask.shape
+
+    boxes = [box for box, area in _components(mask) if area >= min_area * sh * sw]
+    boxes = _merge(boxes)[:max_garments]
+    if not boxes:
+        return [(0, 0, width, height)]
+
+    scale_x, scale_y = width / sw, height / sh
+    result = []
+    for x0, y0, x1, y1 in boxes:
+        px, py = pad * (x1 - x0), pad * (y1 - y0)
+        result.append((
+            max(0, int((x0 - px) * scale_x)),
+            max(0, int((y0 - py) * scale_y)),
+            min(width, int((x1 + px) * scale_x)),
+            min(height, int((y1 + py) * scale_y)),
+        ))
+    return result
+
+
+def crop_garments(img_path, boxes, quality=92):
+    """Crop each box out of the image. Returns the crops as JPEG bytes."""
+    crops = []
+    with Image.open(img_path) as img:
+        img = img.convert("RGB")
+        for box in boxes:
+            buffer = io.BytesIO()
+            img.crop(box).save(buffer, "JPEG", quality=quality)
+            crops.append(buffer.getvalue())
+    return crops
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def make_etag(name, params, version):
+    """Weak ETag for an endpoint's response at a given wardrobe version."""
+    digest = hashlib.sha1(json.dumps([name, params], sort_keys=True).encode()).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on either side.
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in if_none_match.split(",")}
+
+
+class ResponseCache:
+    """
+    Response bodies keyed by (endpoint, normalized params, wardrobe version).
+    Entries from older versions are never served and age out of the LRU.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, name, params, version):
+        return (name, json.dumps(params, sort_keys=True), version)
+
+    def get(self, name, params, version):
+        key = self._key(name, params, version)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, name, params, version, body):
+        key = self._key(name, params, version)
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+class VersionClock:
+    """
+    The wardrobe version held in process memory and re-read from the
+    database at most every max_age seconds, so cached responses cost no
+    database round trip.
+
+    The trade-off is staleness: a change made by another process (a tagging
+    worker or another API instance) may be served from the old version for
+    up to max_age seconds. Changes made through this process call
+    invalidate() and are seen by its next request.
+    """
+
+    def __init__(self, load, max_age=1.0):
+        self.load = load
+        self.max_age = max_age
+        self.value = None
+        self.loaded_at = 0.0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.value is not None and time.monotonic() - self.loaded_at < self.max_age:
+                return self.value
+            generation = self.generation
+        value = self.load()
+        with self.lock:
+            # A read that raced an invalidate() may predate the change.
+            if generation == self.generation:
+                self.value, self.loaded_at = value, time.monotonic()
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.value = None
+            self.generation += 1
+
+
+WARDROBE_VERSION_MAX_AGE = float(os.getenv("WARDROBE_VERSION_MAX_AGE", "1.0"))
@@ -0,0 +1,198 @@
+import os
+import re
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+IMAGE_STORE = os.getenv("IMAGE_STORE", "local")
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "wardrobe_images"))
+# Flat directory of uploads saved under random names before the store existed.
+LEGACY_IMAGE_DIR = os.getenv("LEGACY_IMAGE_DIR", IMAGE_STORE_DIR)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "stylist-images"))
+
+# A stored image's name is the sha256 of its bytes plus its extension.
+_name_pattern = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,5}$")
+
+
+def key_for_name(name):
+    """
+    Storage key for a content-addressed file name, fanned out over two
+    directory levels ("ab/cd/abcd....jpg") so no directory grows too large.
+    Returns None for names the store did not create (legacy uploads).
+    """
+    if not _name_pattern.match(name):
+        return None
+    return f"{name[:2]}/{name[2:4]}/{name}"
+
+
+def is_key(ref):
+    return isinstance(ref, str) and key_for_name(os.path.basename(ref)) == ref
+
+
+def _atomic_write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see either no file or the whole file, never a partial write.
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ImageStore:
+    """
+    Content-addressed image storage. Identical uploads are stored once.
+
+    Items reference images by key. Absolute paths saved before the store
+    existed are still accepted everywhere a key is, and are read straight
+    from the filesystem.
+    """
+
+    def ref_for_name(self, name):
+        """
+        Resolve the file name the frontend requests (the last segment of an
+        item's image_path) to a key, or to a legacy upload's path.
+        Returns None for names that could leave the legacy directory.
+        """
+        key = key_for_name(name)
+        if key:
+            return key
+        if os.path.basename(name) != name or name.startswith("."):
+            return None
+        return os.path.join(LEGACY_IMAGE_DIR, name)
+
+    def put(self, data, ext):
+        """Store image bytes and return their key."""
+        ext = ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+        key = key_for_name(hashlib.sha256(data).hexdigest() + ext)
+        if not self._exists(key):
+            self._write(key, data)
+        return key
+
+    def exists(self, ref):
+        if is_key(ref):
+            return self._exists(ref)
+        return os.path.isfile(ref)
+
+    def read(self, ref):
+        if is_key(ref):
+            return self._read(ref)
+        with open(ref, "rb") as f:
+            return f.read()
+
+    def local_path(self, ref):
+        """A filesystem path with the image's bytes, for PIL and other file readers."""
+        return self._local_path(ref) if is_key(ref) else ref
+
+    def url(self, ref):
+        """A URL the image can be fetched from, e.g. by Marqo when indexing."""
+        return self._url(ref) if is_key(ref) else f"file://{ref}"
+
+
+class LocalImageStore(ImageStore):
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def _write(self, key, data):
+        _atomic_write(self.path(key), data)
+
+    def _read(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def _local_path(self, key):
+        return self.path(key)
+
+    def _url(self, key):
+        return f"file://{self.path(key)}"
+
+
+class S3ImageStore(ImageStore):
+    """
+    Images in an S3-compatible bucket. Set endpoint_url to use MinIO or
+    another local stand-in. Objects are downloaded to a local cache on
+    first use; since keys are content hashes, cached copies never go stale.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, cache_dir=IMAGE_CACHE_DIR, url_expiry=3600):
+        if boto3 is None:
+            raise RuntimeError("IMAGE_STORE=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.cache_dir = cache_dir
+        self.url_expiry = url_expiry
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _object(self, key):
+        return self.prefix + key
+
+    def _exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object(key))
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _write(self, key, data):
+        # A PUT is atomic: the object appears whole or not at all.
+        self.client.put_object(Bucket=self.bucket, Key=self._object(key), Body=data)
+
+    def _read(self, key):
+        path = os.path.join(self.cache_dir, *key.split("/"))
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                return f.read()
+        data = self.client.get_object(Bucket=self.bucket, Key=self._object(key))["Body"].read()
+        _atomic_write(path, data)
+        return data
+
+    def _local_path(self, key):
+        path = os.path.join(self.cache_dir, *key.split("/"))
+        if not os.path.isfile(path):
+            self._read(key)
+        return path
+
+    def _url(self, key):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object(key)},
+            ExpiresIn=self.url_expiry
+        )
+
+
+def from_env():
+    if IMAGE_STORE == "s3":
+        return S3ImageStore(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.getenv("S3_PREFIX", ""),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None
+        )
+    if IMAGE_STORE != "local":
+        raise ValueError(f"Unknown IMAGE_STORE: {IMAGE_STORE}")
+    return LocalImageStore()
+
+
+store = from_env()
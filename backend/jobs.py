@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import traceback
+import multiprocessing
+from contextlib import closing
+from dotenv import load_dotenv
+from llm_pool import NoBackendAvailable
+from llm_scheduler import Overloaded
+
+load_dotenv()
+
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3"))
+
+schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    locked_by TEXT,
+    locked_at REAL,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after, created_at);
+"""
+
+# Maintenance work, claimed only when no upload is waiting, so a new
+# upload's tagging never queues behind recommendation re-scoring.
+background_kinds = ("recommendations",)
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite file, shared by the API and any
+    number of worker threads or processes.
+
+    Jobs move queued -> running -> done, or back to queued with exponential
+    backoff when they fail, until max_attempts is reached and they are marked
+    failed. A running job whose lease expires (its worker crashed) is put
+    back in the queue.
+    """
+
+    def __init__(self, path=JOBS_DB, lease=600.0, max_attempts=5, backoff=5.0):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        with closing(self._connect()) as conn:
+            conn.executescript(schema)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, kind, payload, max_attempts=None):
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), max_attempts or self.max_attempts, now, now, now),
+            )
+        return job_id
+
+    def claim(self, worker_id, kinds=None):
+        """
+        Atomically take the oldest ready job, or return None. Jobs of
+        background_kinds are taken only when no other job is ready.
+        kinds limits the worker to those job kinds.
+        """
+        now = time.time()
+        background = ", ".join("?" * len(background_kinds))
+        query = "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ?"
+        params = [now]
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        query += f" ORDER BY kind IN ({background}), created_at LIMIT 1"
+        params.extend(background_kinds)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, "
+                "locked_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        job = self._to_dict(row)
+        job["attempts"] += 1
+        job["status"] = "running"
+        return job
+
+    def complete(self, job_id, result):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, locked_by = NULL, "
+                "locked_at = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            if row["attempts"] >= row["max_attempts"]:
+                status, run_after = "failed", now
+            else:
+                status, run_after = "queued", now + self.backoff * 2 ** (row["attempts"] - 1)
+            conn.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, error = ?, locked_by = NULL, "
+                "locked_at = NULL, updated_at = ? WHERE id = ?",
+                (status, run_after, error, now, job_id),
+            )
+
+    def defer(self, job_id, delay, error):
+        """
+        Put a running job back in the queue after delay seconds without
+        counting the attempt, e.g. when the LLM shed it under load.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), run_after = ?, "
+                "error = ?, locked_by = NULL, locked_at = NULL, updated_at = ? WHERE id = ?",
+                (now + delay, error, now, job_id),
+            )
+
+    def heartbeat(self, job_id, worker_id):
+        """Renew the lease on a running job."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET locked_at = ? WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (time.time(), job_id, worker_id),
+            )
+
+    def recover(self):
+        """
+        Requeue running jobs whose worker stopped renewing them. A job that
+        has used all its attempts is marked failed instead, so one that
+        crashes its worker every time is not retried forever.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker stopped during the last attempt', "
+                "locked_by = NULL, locked_at = NULL, updated_at = ? "
+                "WHERE status = 'running' AND locked_at < ? AND attempts >= max_attempts",
+                (now, now - self.lease),
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', locked_by = NULL, locked_at = NULL, updated_at = ? "
+                "WHERE status = 'running' AND locked_at < ?",
+                (now, now - self.lease),
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+def _index_item(item):
+    from v_database import save_to_marqo
+
+    # Marqo upserts by id, so re-running this step after a crash is safe.
+    save_to_marqo(
+        id=item["_id"],
+        description=item.get("description", ""),
+        img_path=item.get("image_path", ""),
+        seasons=",".join(item.get("seasons", [])),
+        occasions=",".join(item.get("occasions", [])),
+        style_tags=",".join(item.get("style_tags", [])),
+        body_part=item.get("body_part", "")
+    )
+
+
+def tag_item(payload):
+    """Tag an uploaded image and save it to MongoDB and Marqo."""
+    from ask_llm import analyze_clothing
+    from database import save_item_to_db, clothes
+    from llm_scheduler import BULK
+    from colors import extract_palette, apply_palette
+    from image_store import store
+
+    item_id = payload["item_id"]
+    image_path = payload["image_path"]
+
+    item = clothes.find_one({"_id": item_id})
+    if item is None:
+        metadata = analyze_clothing(image_path, priority=BULK)
+        metadata["image_path"] = image_path
+        apply_palette(metadata, extract_palette(store.local_path(image_path)))
+        save_item_to_db(item_id, metadata)
+        item = clothes.find_one({"_id": item_id})
+
+    _index_item(item)
+    queue.enqueue("recommendations", {"action": "add", "item_id": item_id})
+    return {"item_id": item_id, "item": item}
+
+
+def tag_garments(payload):
+    """
+    Split a photo of several garments into one crop per garment, tag all
+    crops in one batched request and save each as its own item.
+    """
+    from ask_llm import analyze_clothing_batch
+    from database import save_item_to_db, get_items_by_ids
+    from llm_scheduler import BULK
+    from colors import extract_palette, apply_palette
+    from garments import detect_garments, crop_garments
+    from image_store import store
+
+    image_path = payload["image_path"]
+    local_path = store.local_path(image_path)
+
+    boxes = detect_garments(local_path)
+    # Crops are content-addressed too, so a retried job stores nothing twice.
+    crops = [store.put(crop, ".jpg") for crop in crop_garments(local_path, boxes)]
+    # Ids derive from the source photo, so a retried job finds the items it already saved.
+    item_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{image_path}#{i}")) for i in range(len(crops))]
+
+    existing = get_items_by_ids(item_ids)
+    pending = [(item_id, crop) for item_id, crop in zip(item_ids, crops) if item_id not in existing]
+    if pending:
+        results = analyze_clothing_batch([crop for _, crop in pending], priority=BULK)
+        for (item_id, crop), metadata in zip(pending, results):
+            metadata["image_path"] = crop
+            metadata["source_image_path"] = image_path
+            apply_palette(metadata, extract_palette(store.local_path(crop)))
+            save_item_to_db(item_id, metadata)
+        existing = get_items_by_ids(item_ids)
+
+    items = [existing[item_id] for item_id in item_ids]
+    for item in items:
+        _index_item(item)
+        queue.enqueue("recommendations", {"action": "add", "item_id": item["_id"]})
+    return {"item_ids": item_ids, "items": items}
+
+
+def update_recommendations(payload):
+    """Build one context's stored outfits, or keep them in step with one wardrobe change."""
+    from recommendations import add_item, remove_item, refresh_item, build_context
+
+    if payload["action"] == "build":
+        doc = build_context(payload["context"])
+        return {"contexts": 1, "outfits": len(doc["outfits"])}
+    actions = {"add": add_item, "remove": remove_item, "refresh": refresh_item}
+    return {"contexts": actions[payload["action"]](payload["item_id"])}
+
+
+handlers = {
+    "tag": tag_item,
+    "tag_garments": tag_garments,
+    "recommendations": update_recommendations,
+}
+
+
+def run_worker(queue, stop=None, poll=1.0, worker_id=None, kinds=None):
+    worker_id = worker_id or f"{os.getpid()}-{threading.get_ident()}"
+    last_recover = 0.0
+    while stop is None or not stop.is_set():
+        if time.time() - last_recover > queue.lease / 4:
+            recovered = queue.recover()
+            if recovered:
+                print(f"Requeued {recovered} stale jobs")
+            last_recover = time.time()
+
+        job = queue.claim(worker_id, kinds)
+        if job is None:
+            if stop is not None:
+                stop.wait(poll)
+            else:
+                time.sleep(poll)
+            continue
+
+        print(f"Running job {job['id']} ({job['kind']}), attempt {job['attempts']}")
+        done = threading.Event()
+
+        def keep_alive():
+            while not done.wait(queue.lease / 4):
+                queue.heartbeat(job["id"], worker_id)
+
+        threading.Thread(target=keep_alive, daemon=True).start()
+        try:
+            result = handlers[job["kind"]](job["payload"])
+            queue.complete(job["id"], result)
+        except (Overloaded, NoBackendAvailable) as e:
+            # Shed under load or no backend up: not the job's fault.
+            print(f"Job {job['id']} deferred {e.retry_after}s: {str(e)}")
+            queue.defer(job["id"], e.retry_after, str(e))
+        except Exception as e:
+            print(f"Job {job['id']} failed: {str(e)}")
+            queue.fail(job["id"], "".join(traceback.format_exception_only(type(e), e)).strip())
+        finally:
+            done.set()
+
+
+def start_worker_threads(queue, count, kinds=None, name="t"):
+    stop = threading.Event()
+    for i in range(count):
+        threading.Thread(
+            target=run_worker,
+            args=(queue,),
+            kwargs={"stop": stop, "worker_id": f"{os.getpid()}-{name}{i}", "kinds": kinds},
+            daemon=True,
+        ).start()
+    return stop
+
+
+def _process_main(path):
+    run_worker(JobQueue(path))
+
+
+queue = JobQueue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background tagging workers")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--api", default=os.getenv("LLM_GATEWAY_URL", "http://127.0.0.1:8000"),
+                        help="API whose scheduler admits the workers' LLM calls")
+    args = parser.parse_args()
+
+    # Each process would otherwise build its own scheduler and pool, with no
+    # shared caps, priorities or slot counts; the API's scheduler is the only one.
+    os.environ["LLM_GATEWAY_URL"] = args.api
+
+    processes = [multiprocessing.Process(target=_process_main, args=(JOBS_DB,)) for _ in range(args.workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
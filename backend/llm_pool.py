@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import threading
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backends are separated by ";" and each may carry options, e.g.
+# LLM_BACKENDS="http://127.0.0.1:8034 kinds=vision;http://127.0.0.1:8035 slots=4 kinds=text"
+default_backends = "http://127.0.0.1:8034"
+
+
+class NoBackendAvailable(Exception):
+    """Raised when no healthy backend can take a call. Maps to HTTP 503."""
+
+    def __init__(self, message, retry_after=10):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Errors that say something about the backend rather than the request:
+# it is unreachable, too slow, or broken. Only these count toward ejection.
+retryable_errors = (requests.ConnectionError, requests.Timeout)
+
+
+def _backend_failed(error):
+    if isinstance(error, retryable_errors):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+class Backend:
+    def __init__(self, url, slots=None, kinds=None):
+        self.url = url.rstrip("/")
+        self.configured_slots = slots
+        self.slots = slots or 1
+        self.kinds = set(kinds) if kinds else None
+        self.in_flight = 0
+        self.latency = None
+        self.healthy = True
+        self.failures = 0
+        self.served = 0
+
+    def serves(self, kind):
+        return self.kinds is None or kind in self.kinds
+
+    def cost(self):
+        # Expected wait for one more request: queue position times latency.
+        latency = self.latency if self.latency is not None else 1.0
+        return (self.in_flight + 1) / self.slots * latency
+
+    def status(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "kinds": sorted(self.kinds) if self.kinds else None,
+            "served": self.served,
+            "failures": self.failures,
+        }
+
+
+def parse_backends(spec):
+    backends = []
+    for entry in spec.split(";"):
+        parts = entry.split()
+        if not parts:
+            continue
+        options = dict(p.split("=", 1) for p in parts[1:] if "=" in p)
+        backends.append(Backend(
+            parts[0],
+            slots=int(options["slots"]) if "slots" in options else None,
+            kinds=options["kinds"].split(",") if "kinds" in options else None,
+        ))
+    return backends
+
+
+class BackendPool:
+    """
+    Routes OpenAI-compatible chat calls across several llama.cpp servers.
+
+    Each call goes to the healthy backend with the lowest expected wait
+    (in-flight requests per slot times observed latency), among those whose
+    kinds include the call's kind. A backend never has more requests in flight
+    than it has slots. Backends that fail are ejected and re-admitted once
+    their /health endpoint reports ok again.
+    """
+
+    def __init__(self, backends, health_interval=10.0, max_failures=3,
+                 acquire_timeout=300.0, alpha=0.3):
+        self.backends = backends
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.acquire_timeout = acquire_timeout
+        self.alpha = alpha
+        self.cond = threading.Condition()
+        self._checker = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            parse_backends(os.getenv("LLM_BACKENDS", default_backends)),
+            health_interval=float(os.getenv("LLM_HEALTH_INTERVAL", "10")),
+        )
+
+    def start(self):
+        with self.cond:
+            if self._checker is not None:
+                return
+            self._checker = threading.Thread(target=self._health_loop, daemon=True)
+        self.check_health()
+        self._checker.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            self.check_health()
+
+    def check_health(self):
+        for backend in self.backends:
+            try:
+                ok = requests.get(f"{backend.url}/health", timeout=5).status_code == 200
+                slots = backend.configured_slots
+                if ok and slots is None:
+                    props = requests.get(f"{backend.url}/props", timeout=5)
+                    if props.status_code == 200:
+                        slots = props.json().get("total_slots")
+            except (requests.RequestException, ValueError):
+                ok, slots = False, None
+            with self.cond:
+                if ok and not backend.healthy:
+                    print(f"LLM backend re-admitted: {backend.url}")
+                elif not ok and backend.healthy:
+                    print(f"LLM backend ejected: {backend.url}")
+                backend.healthy = ok
+                if ok:
+                    backend.failures = 0
+                if slots:
+                    backend.slots = int(slots)
+                self.cond.notify_all()
+
+    def _candidates(self, kind):
+        return [b for b in self.backends if b.healthy and b.serves(kind)]
+
+    def acquire(self, kind, exclude=()):
+        self.start()
+        deadline = time.monotonic() + self.acquire_timeout
+        with self.cond:
+            while True:
+                candidates = [b for b in self._candidates(kind) if b not in exclude]
+                if not candidates:
+                    raise NoBackendAvailable(
+                        f"No healthy LLM backend for '{kind}' calls",
+                        retry_after=max(1, int(self.health_interval))
+                    )
+                free = [b for b in candidates if b.in_flight < b.slots]
+                if free:
+                    backend = min(free, key=lambda b: b.cost())
+                    backend.in_flight += 1
+                    return backend
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise NoBackendAvailable(f"Timed out waiting for an LLM slot for '{kind}' calls")
+                self.cond.wait(remaining)
+
+    def release(self, backend, elapsed=None, failed=False):
+        with self.cond:
+            backend.in_flight -= 1
+            if failed:
+                backend.failures += 1
+                if backend.failures >= self.max_failures and backend.healthy:
+                    backend.healthy = False
+                    print(f"LLM backend ejected: {backend.url}")
+            else:
+                backend.failures = 0
+                backend.served += 1
+                if elapsed is not None:
+                    if backend.latency is None:
+                        backend.latency = elapsed
+                    else:
+                        backend.latency = self.alpha * elapsed + (1 - self.alpha) * backend.latency
+            self.cond.notify_all()
+
+    def post(self, path, payload, kind="text", timeout=600):
+        """
+        POST payload to path on the best backend for kind and return the
+        decoded JSON body. A connection failure or timeout is retried once on
+        another backend. Only those and 5xx responses count against the
+        backend; a 4xx or an undecodable body is the request's fault.
+        """
+        tried = []
+        while True:
+            backend = self.acquire(kind, exclude=tried)
+            start = time.monotonic()
+            try:
+                response = requests.post(f"{backend.url}{path}", json=payload, timeout=timeout)
+                response.raise_for_status()
+                body = response.json()
+            except retryable_errors:
+                self.release(backend, failed=True)
+                tried.append(backend)
+                with self.cond:
+                    others = [b for b in self._candidates(kind) if b not in tried]
+                if len(tried) > 1 or not others:
+                    raise
+                continue
+            except Exception as e:
+                self.release(backend, failed=_backend_failed(e))
+                raise
+            self.release(backend, elapsed=time.monotonic() - start)
+            return body
+
+    def stream(self, path, payload, kind="text", timeout=600):
+        """
+        POST a streaming request and yield each decoded server-sent event.
+        The backend slot is held until the stream is exhausted or closed.
+        """
+        backend = self.acquire(kind)
+        start = time.monotonic()
+        failed = True
+        error = None
+        try:
+            with requests.post(f"{backend.url}{path}", json={**payload, "stream": True},
+                               stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    yield json.loads(data)
+            failed = False
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if failed and (error is None or not _backend_failed(error)):
+                # Closed early by the consumer, or the request's own fault.
+                self.release(backend)
+            else:
+                self.release(backend, elapsed=None if failed else time.monotonic() - start, failed=failed)
+
+    def chat(self, payload, kind="text"):
+        return self.post("/v1/chat/completions", payload, kind=kind)
+
+    def capacity(self):
+        with self.cond:
+            return sum(b.slots for b in self.backends if b.healthy)
+
+    def status(self):
+        with self.cond:
+            return [b.status() for b in self.backends]
+
+
+pool = BackendPool.from_env()
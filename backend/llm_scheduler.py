@@ -0,0 +1,280 @@
+import os
+import json
+import math
+import time
+import asyncio
+import hashlib
+import itertools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from llm_pool import pool
+
+load_dotenv()
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Lower rank runs first.
+priority_rank = {INTERACTIVE: 0, BULK: 1}
+
+
+class Overloaded(Exception):
+    """Raised when LLM work is shed instead of queued. Maps to HTTP 429."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueSaturated(Overloaded):
+    pass
+
+
+class DeadlineExceeded(Overloaded):
+    pass
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Scheduler:
+    """
+    Central admission control for LLM calls.
+
+    Work is tagged with a priority class. Queued work runs in priority order,
+    earliest deadline first within a class, subject to a per-class cap and a
+    total cap equal to the backend capacity. When the queue is full, the
+    lowest-priority queued request is shed to make room for a higher-priority
+    one, so bulk work never causes interactive rejections; if nothing queued
+    ranks below the new request, it is rejected instead. A request whose
+    expected wait already exceeds its deadline is rejected straight away.
+    Rejections carry a Retry-After estimate. Identical requests already in
+    flight are coalesced and share one result.
+
+    Async endpoints hand their LLM work to offload(), which runs it on the
+    scheduler's own threads: one per queue entry plus one per running call,
+    so every request the queue can hold has a thread to wait in, and
+    waiting LLM work never starves the shared threadpool.
+    """
+
+    def __init__(self, capacity, caps=None, max_queue=64, timeouts=None):
+        self.capacity = capacity
+        self.caps = caps or {INTERACTIVE: 8, BULK: 2}
+        self.max_queue = max_queue
+        self.timeouts = timeouts or {INTERACTIVE: 120.0, BULK: 1800.0}
+        self.threads = max_queue + sum(self.caps.values())
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="llm")
+        self.occupied = {c: 0 for c in priority_rank}
+        self.cond = threading.Condition()
+        self.queue = []
+        self.evicted = set()
+        self.running = {c: 0 for c in priority_rank}
+        self.flights = {}
+        self.seq = itertools.count()
+        self.service_time = 5.0
+        self.waits = {c: deque(maxlen=500) for c in priority_rank}
+        self.counters = {
+            "admitted": 0,
+            "rejected": 0,
+            "evicted": 0,
+            "expired": 0,
+            "coalesced": 0,
+        }
+
+    @classmethod
+    def from_env(cls, capacity):
+        return cls(
+            capacity,
+            caps={
+                INTERACTIVE: int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", "8")),
+                BULK: int(os.getenv("LLM_BULK_CONCURRENCY", "2")),
+            },
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+        )
+
+    def _expected_wait(self, priority):
+        ahead = sum(1 for t in self.queue if priority_rank[t[3]] <= priority_rank[priority])
+        busy = sum(self.running.values())
+        slots = max(1, self.capacity())
+        return (ahead + max(0, busy - slots + 1)) * self.service_time / slots
+
+    def _runnable(self):
+        total = sum(self.running.values())
+        if total >= max(1, self.capacity()):
+            return None
+        for ticket in sorted(self.queue):
+            if self.running[ticket[3]] < self.caps[ticket[3]]:
+                return ticket
+        return None
+
+    def _admit(self, priority, deadline):
+        with self.cond:
+            now = time.monotonic()
+            wait = self._expected_wait(priority)
+            if now + wait > deadline:
+                self.counters["rejected"] += 1
+                raise DeadlineExceeded("LLM queue wait exceeds the request deadline", retry_after=max(1, math.ceil(wait)))
+            if len(self.queue) >= self.max_queue:
+                # Shed the lowest-priority, latest-deadline ticket if it ranks below this one.
+                victim = max(self.queue)
+                if victim[0] <= priority_rank[priority]:
+                    self.counters["rejected"] += 1
+                    raise QueueSaturated("LLM queue is full", retry_after=max(1, math.ceil(wait)))
+                self.queue.remove(victim)
+                self.evicted.add(victim)
+                self.counters["evicted"] += 1
+                self.cond.notify_all()
+
+            ticket = (priority_rank[priority], deadline, next(self.seq), priority)
+            self.queue.append(ticket)
+            try:
+                while self._runnable() != ticket:
+                    if ticket in self.evicted:
+                        self.evicted.discard(ticket)
+                        raise QueueSaturated(
+                            "Shed from a full LLM queue for higher-priority work",
+                            retry_after=max(1, math.ceil(self._expected_wait(priority))),
+                        )
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["expired"] += 1
+                        raise DeadlineExceeded(
+                            "Request deadline passed while queued for the LLM",
+                            retry_after=max(1, math.ceil(self._expected_wait(priority))),
+                        )
+                    self.cond.wait(remaining)
+            finally:
+                if ticket in self.queue:
+                    self.queue.remove(ticket)
+                self.cond.notify_all()
+
+            self.running[priority] += 1
+            self.counters["admitted"] += 1
+            self.waits[priority].append(time.monotonic() - now)
+
+    def _release(self, priority, elapsed):
+        with self.cond:
+            self.running[priority] -= 1
+            self.service_time = 0.2 * elapsed + 0.8 * self.service_time
+            self.cond.notify_all()
+
+    def _call(self, fn, priority, deadline):
+        self._admit(priority, deadline)
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            self._release(priority, time.monotonic() - start)
+
+    def run(self, fn, priority=INTERACTIVE, key=None, timeout=None):
+        """
+        Run fn once admitted. Calls sharing a key while one is in flight wait
+        for that call and return its result instead of running again.
+        """
+        deadline = time.monotonic() + (timeout or self.timeouts[priority])
+        if key is None:
+            return self._call(fn, priority, deadline)
+
+        with self.cond:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if not flight.done.wait(max(0, deadline - time.monotonic())):
+                raise DeadlineExceeded("Request deadline passed while waiting on an identical call", retry_after=1)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._call(fn, priority, deadline)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.cond:
+                self.flights.pop(key, None)
+            flight.done.set()
+
+    def stream(self, gen_fn, priority=INTERACTIVE, timeout=None):
+        """
+        Admit a streaming call and yield from it. The slot is held until the
+        stream finishes or the consumer stops reading.
+        """
+        deadline = time.monotonic() + (timeout or self.timeouts[priority])
+        self._admit(priority, deadline)
+        start = time.monotonic()
+        try:
+            yield from gen_fn()
+        finally:
+            self._release(priority, time.monotonic() - start)
+
+    async def offload(self, fn, *args, priority=INTERACTIVE, **kwargs):
+        """
+        Run blocking work that makes LLM calls on the scheduler's threads.
+        When none is free the call is rejected straight away instead of
+        waiting for a thread with no deadline. Bulk work may not take the
+        threads kept for the interactive cap, so interactive requests can
+        always reach the queue and shed bulk work from it.
+        """
+        limit = self.threads if priority == INTERACTIVE else self.threads - self.caps[INTERACTIVE]
+        with self.cond:
+            if sum(self.occupied.values()) >= self.threads or self.occupied[priority] >= limit:
+                self.counters["rejected"] += 1
+                raise QueueSaturated(
+                    "All LLM worker threads are busy",
+                    retry_after=max(1, math.ceil(self._expected_wait(priority))),
+                )
+            self.occupied[priority] += 1
+
+        def call():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.cond:
+                    self.occupied[priority] -= 1
+
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, call)
+
+    def metrics(self):
+        with self.cond:
+            depth = {c: sum(1 for t in self.queue if t[3] == c) for c in priority_rank}
+            waits = {}
+            for c, samples in self.waits.items():
+                ordered = sorted(samples)
+                waits[c] = {
+                    "count": len(ordered),
+                    "avg": sum(ordered) / len(ordered) if ordered else 0.0,
+                    "p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0,
+                }
+            return {
+                "capacity": self.capacity(),
+                "queue_depth": depth,
+                "running": dict(self.running),
+                "caps": dict(self.caps),
+                "threads": {"total": self.threads, **self.occupied},
+                "wait_seconds": waits,
+                "service_time": self.service_time,
+                "in_flight_keys": len(self.flights),
+                **self.counters,
+            }
+
+
+def request_key(payload, kind):
+    return hashlib.sha256(json.dumps([kind, payload], sort_keys=True).encode()).hexdigest()
+
+
+scheduler = Scheduler.from_env(pool.capacity)
@@ -1,10 +1,13 @@
 import os
+import time
 import uuid
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+import tempfile
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Header
+from profiling import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse
 from typing import List, Dict, Any
 import uvicorn
 from pymongo import MongoClient
@@ -12,11 +15,23 @@ from dotenv import load_dotenv
 import marqo
 
 # Import existing modules
-from database import get_items_by_id, save_item_to_db, clothes
-from v_database import mq, save_to_marqo, get_style_candidates
+from database import get_items_by_id, get_items_by_ids, save_item_to_db, update_item_in_db, delete_item_from_db, get_wardrobe_version, clothes
+from v_database import mq, save_to_marqo, get_style_candidates, delete_from_marqo
 from processor import process_image, categorize, generate_candidates, score_outfits
 from utilities import encode_image, convert_heic_to_jpeg
 from ask_llm import analyze_clothing, score_outfit, explain_outfit, extract_style_preferences
+from planner import plan_outfits
+from llm_pool import pool, NoBackendAvailable
+from llm_scheduler import scheduler, request_key, priority_rank, Overloaded, INTERACTIVE, BULK
+from outfit_search import parse_outfit_id
+from explanations import explanation_events, cache as explanation_cache
+from jobs import queue as job_queue, start_worker_threads, handlers as job_handlers, background_kinds
+from http_cache import response_cache, normalize_query, make_etag, etag_matches, VersionClock, WARDROBE_VERSION_MAX_AGE
+from outfit_payloads import json_response, compact_outfits
+import profiling
+from colors import extract_palette, apply_palette
+from recommendations import get_recommendations, missing_common_contexts, RECOMMEND_TOP
+from image_store import store as image_store, LocalImageStore, is_key
 
 # Load environment variables
 load_dotenv()
@@ -36,14 +51,126 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add this after your existing imports
-UPLOAD_FOLDER = "/Users/raj/Documents/GitHub/personal-stylist/wardrobe_images/"
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    Profile a request when asked to with an X-Profile header or ?profile=1,
+    and every request when PROFILE_SLOW_MS is set, keeping only the profiles
+    of requests slower than that threshold.
+    """
+    requested = profiling.should_profile(request)
+    if not requested and not profiling.PROFILE_SLOW_MS:
+        return await call_next(request)
+
+    # The event loop thread runs this request's async code, and that of any
+    # concurrent request, so its samples are marked shared. Blocking work
+    # goes through profiling.run_in_threadpool or run_llm, which track its thread.
+    sampler = profiling.Sampler().start()
+    start = time.monotonic()
+    try:
+        with sampler.activate(), sampler.track(shared=True):
+            response = await call_next(request)
+    finally:
+        sampler.stop()
+    duration = time.monotonic() - start
+
+    slow = profiling.PROFILE_SLOW_MS and duration * 1000 >= profiling.PROFILE_SLOW_MS
+    if requested or slow:
+        profile_id = await run_in_threadpool(
+            profiling.save_profile,
+            sampler,
+            request.method,
+            request.url.path,
+            duration,
+            response.status_code,
+            "requested" if requested else "slow"
+        )
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+async def run_llm(fn, *args, priority=INTERACTIVE, **kwargs):
+    """Run blocking work that calls the LLM on the scheduler's own threads."""
+    return await scheduler.offload(profiling.tracked(fn), *args, priority=priority, **kwargs)
+
+loopback_hosts = {"127.0.0.1", "::1", "localhost"}
+
+def require_admin(token):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if admin_token and token != admin_token:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.exception_handler(NoBackendAvailable)
+async def no_backend_handler(request: Request, exc: NoBackendAvailable):
+    """Every LLM backend is down or busy past the wait limit; ask clients to retry."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load with a fast 429 instead of letting LLM latency grow without limit."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.on_event("startup")
+def start_tagging_workers():
+    """
+    Run tagging workers inside the API process; set TAG_WORKERS=0 to use
+    jobs.py instead. Recommendation upkeep gets its own RECOMMEND_WORKERS
+    threads, so uploads are never tagged behind it.
+    """
+    upload_kinds = [kind for kind in job_handlers if kind not in background_kinds]
+    start_worker_threads(job_queue, int(os.getenv("TAG_WORKERS", "1")), kinds=upload_kinds)
+    start_worker_threads(job_queue, int(os.getenv("RECOMMEND_WORKERS", "1")), kinds=list(background_kinds), name="r")
+
+@app.on_event("startup")
+def build_common_recommendations():
+    """Queue builds for the common recommendation contexts not stored yet."""
+    try:
+        for context in missing_common_contexts():
+            job_queue.enqueue("recommendations", {"action": "build", "context": context})
+    except Exception as e:
+        print(f"Could not queue recommendation builds: {str(e)}")
+
+wardrobe_version = VersionClock(get_wardrobe_version, WARDROBE_VERSION_MAX_AGE)
+
+def versioned_response(request: Request, name: str, params: dict, compute):
+    """
+    Serve a wardrobe-dependent GET response with an ETag built from the
+    wardrobe version. Answers conditional requests with 304 and reuses the
+    cached body for identical requests until the wardrobe changes.
+
+    The version comes from memory (see VersionClock): changes made through
+    this process show up at once, changes from tagging workers or other
+    instances within WARDROBE_VERSION_MAX_AGE seconds.
+    """
+    version = wardrobe_version.get()
+    etag = make_etag(name, params, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(name, params, version)
+    if body is None:
+        body = jsonable_encoder(compute())
+        response_cache.put(name, params, version, body)
 
-# Create the upload directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    return JSONResponse(content=body, headers=headers)
 
+# Add this after your existing imports
 @app.post("/upload/")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), multi: bool = False):
+    """
+    Save an uploaded image and queue it for tagging. With multi=true the
+    photo may hold several garments (a flat-lay or full outfit); each is
+    cropped and saved as its own item.
+    """
     # Get file extension and check if it's a supported format
     file_extension = os.path.splitext(file.filename)[1].lower()
     is_heic = file_extension in {'.heic', '.heif'}
@@ -55,37 +182,37 @@ async def upload_file(file: UploadFile = File(...)):
             detail=f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}"
         )
     
+    temp_heic = None
     try:
         # Read the file content
         content = await file.read()
         
-        # Generate a unique filename
-        unique_filename = f"{str(uuid.uuid4())}.jpg" if is_heic else f"{str(uuid.uuid4())}{file_extension}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
+        if is_heic:
+            # Save HEIC temporarily and convert it to JPEG
+            temp_heic = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.heic")
+            with open(temp_heic, "wb") as f:
+                f.write(content)
+            jpeg_path = convert_heic_to_jpeg(temp_heic)
+            with open(jpeg_path, "rb") as jpeg_file:
+                content = jpeg_file.read()
+            if os.path.exists(jpeg_path):
+                os.remove(jpeg_path)
+            file_extension = ".jpg"
         
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            if is_heic:
-                # Save HEIC temporarily
-                temp_heic = f"{file_path}.heic"
-                with open(temp_heic, "wb") as f:
-                    f.write(content)
-                # Convert to JPEG
-                jpeg_path = convert_heic_to_jpeg(temp_heic)
-                # Read the converted file
-                with open(jpeg_path, "rb") as jpeg_file:
-                    buffer.write(jpeg_file.read())
-                # Clean up
-                os.remove(temp_heic)
-                if os.path.exists(jpeg_path):
-                    os.remove(jpeg_path)
-            else:
-                # For non-HEIC files, save directly
-                buffer.write(content)
+        # Store the file under its content hash; identical uploads share one copy
+        file_path = await run_in_threadpool(image_store.put, content, file_extension)
+        unique_filename = os.path.basename(file_path)
         
-        # Process the image and save to database if needed
-        # item_data = process_image(file_path)
-        # save_item_to_db(unique_filename, item_data, file_path)
+        # Tag the image and save it to the databases in the background
+        if multi:
+            job_id = job_queue.enqueue("tag_garments", {
+                "image_path": file_path
+            })
+        else:
+            job_id = job_queue.enqueue("tag", {
+                "item_id": str(uuid.uuid4()),
+                "image_path": file_path
+            })
         
         return JSONResponse(
             status_code=200,
@@ -93,36 +220,52 @@ async def upload_file(file: UploadFile = File(...)):
                 "message": "File uploaded and converted successfully" if is_heic else "File uploaded successfully",
                 "filename": unique_filename,
                 "file_path": file_path,
-                "converted_from_heic": is_heic
+                "converted_from_heic": is_heic,
+                "job_id": job_id,
+                "multi": multi
             }
         )
         
     except Exception as e:
-        # Clean up the file if something goes wrong
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        if temp_heic and os.path.exists(temp_heic):
+            os.remove(temp_heic)
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Poll a background job. Status is one of queued, running, done or failed;
+    a finished tagging job carries the saved item (or items, for a
+    multi-garment upload) in its result.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "error": job["error"],
+        "result": job["result"]
+    }
 
 @app.post("/analyze/clothing/")
 async def analyze_clothing_endpoint(image_path: str):
     """
     Endpoint to analyze clothing and generate tags.
-    Accepts a path to an image and returns structured metadata.
+    Accepts an image store key (or a path to an image) and returns
+    structured metadata.
     """
-    # Validate the image path exists
-    if not os.path.exists(image_path):
+    # Validate the image exists
+    if not image_store.exists(image_path):
         raise HTTPException(
             status_code=400,
             detail="Image file not found at the specified path"
         )
     
-    # Check if it's a file
-    if not os.path.isfile(image_path):
-        raise HTTPException(
-            status_code=400,
-            detail="The specified path is not a file"
-        )
-    
     # Check file extension
     file_extension = os.path.splitext(image_path)[1].lower()
     allowed_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'}
@@ -135,11 +278,14 @@ async def analyze_clothing_endpoint(image_path: str):
     
     try:
         # Analyze the clothing
-        analysis_result = analyze_clothing(image_path)
+        analysis_result = await run_llm(analyze_clothing, image_path)
         analysis_result['image_path'] = image_path
+        apply_palette(analysis_result, extract_palette(image_store.local_path(image_path)))
         
         return analysis_result
             
+    except (Overloaded, NoBackendAvailable):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -167,6 +313,8 @@ async def create_item(item_data: dict):
         
         # Save to database
         save_item_to_db(item_id, item_data)
+        wardrobe_version.invalidate()
+        job_queue.enqueue("recommendations", {"action": "add", "item_id": item_id})
         
         # Return success response
         return {
@@ -251,8 +399,69 @@ async def get_mongodb_item(item_id: str):
             detail=f"Error retrieving item from MongoDB: {str(e)}"
         )
 
+@app.patch("/items/{item_id}")
+async def update_item(item_id: str, fields: dict):
+    """
+    Update fields of a clothing item and re-index it in the vector database.
+    """
+    fields.pop("_id", None)
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    try:
+        if not update_item_in_db(item_id, fields):
+            raise HTTPException(status_code=404, detail="Item not found")
+        wardrobe_version.invalidate()
+
+        item = clothes.find_one({"_id": item_id})
+        save_to_marqo(
+            id=item_id,
+            description=item.get("description", ""),
+            img_path=item.get("image_path", ""),
+            seasons=",".join(item.get("seasons", [])),
+            occasions=",".join(item.get("occasions", [])),
+            style_tags=",".join(item.get("style_tags", [])),
+            body_part=item.get("body_part", "")
+        )
+        explanation_cache.drop_item(item_id)
+        job_queue.enqueue("recommendations", {"action": "refresh", "item_id": item_id})
+        return {"message": "Item updated successfully", "item": item}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error updating item: {str(e)}"
+        )
+
+@app.delete("/items/{item_id}")
+async def delete_item(item_id: str):
+    """
+    Delete a clothing item from MongoDB and the vector database.
+    """
+    try:
+        if not delete_item_from_db(item_id):
+            raise HTTPException(status_code=404, detail="Item not found")
+        wardrobe_version.invalidate()
+        delete_from_marqo(item_id)
+        explanation_cache.drop_item(item_id)
+        job_queue.enqueue("recommendations", {"action": "remove", "item_id": item_id})
+        return {"message": "Item deleted successfully", "item_id": item_id}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error deleting item: {str(e)}"
+        )
+
 @app.get("/search/style/")
-async def search_style_candidates(query: str = Query(..., description="Search query for style recommendations")):
+async def search_style_candidates(
+    request: Request,
+    query: str = Query(..., description="Search query for style recommendations")
+):
     """
     Search for style candidates based on a text query.
     Returns the top 20 matching items from the vector database.
@@ -264,15 +473,18 @@ async def search_style_candidates(query: str = Query(..., description="Search qu
             detail="Search query cannot be empty"
         )
     
-    # Get style candidates
-    results = get_style_candidates(query)
-    results = get_items_by_id(results)
+    def compute():
+        # Get style candidates
+        results = get_style_candidates(query)
+        results = get_items_by_id(results)
+        
+        return {
+            "message": "Got matching style candidates",
+            "count": len(results),
+            "results": results
+        }
     
-    return {
-        "message": "Got matching style candidates",
-        "count": len(results),
-        "results": results
-    }
+    return versioned_response(request, "search_style", {"query": normalize_query(query)}, compute)
     
     # except Exception as e:
     #     raise HTTPException(
@@ -282,6 +494,7 @@ async def search_style_candidates(query: str = Query(..., description="Search qu
 
 @app.get("/outfit/components/")
 async def get_outfit_components(
+    request: Request,
     query: str = Query(..., description="Search query for outfit components"),
     top_items: int = Query(3, description="Number of top items to return per category")
 ):
@@ -296,29 +509,39 @@ async def get_outfit_components(
                 detail="Search query cannot be empty"
             )
         
-        # Search for each component type separately
-        components = {}
-        for part in ["upper", "lower", "footwear", "outerwear"]:
-            # Get items for this body part
-            results = get_style_candidates(query, body_part=part, limit=top_items)
-            items = get_items_by_id(results)
-            
-            # Map to the correct slot name
-            slot_name = {
-                "upper": "tops",
-                "lower": "bottoms",
-                "footwear": "shoes",
-                "outerwear": "outerwear"
-            }.get(part, part)
+        def compute():
+            # Search for each component type separately
+            components = {}
+            for part in ["upper", "lower", "footwear", "outerwear"]:
+                # Get items for this body part
+                results = get_style_candidates(query, body_part=part, limit=top_items)
+                items = get_items_by_id(results)
+                
+                # Map to the correct slot name
+                slot_name = {
+                    "upper": "tops",
+                    "lower": "bottoms",
+                    "footwear": "shoes",
+                    "outerwear": "outerwear"
+                }.get(part, part)
+                
+                components[slot_name] = items
             
-            components[slot_name] = items
+            return {
+                "message": "Fetched outfit components",
+                "query": query,
+                "components": components
+            }
         
-        return {
-            "message": "Fetched outfit components",
-            "query": query,
-            "components": components
-        }
+        return versioned_response(
+            request,
+            "outfit_components",
+            {"query": normalize_query(query), "top_items": top_items},
+            compute
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -357,9 +580,15 @@ async def categorize_items(items: List[dict]):
         )
 
 @app.post("/outfits/generate/")
-async def generate_outfits(slots: dict):
+async def generate_outfits(
+    request: Request,
+    slots: dict,
+    limit: int = Query(20, description="Number of outfits to return"),
+    max_per_item: int = Query(2, description="How many outfits may share the same item"),
+    format: str = Query("full", description="'full' embeds items in each outfit, 'compact' returns an item table and id tuples")
+):
     """
-    Generate all possible outfit combinations from categorized items.
+    Generate the best outfit combinations from categorized items.
     Expects a dictionary with categorized items like:
     {
         "top": [...],
@@ -367,6 +596,8 @@ async def generate_outfits(slots: dict):
         "shoes": [...],
         "outerwear": [...]
     }
+    With format=compact, items are listed once under "items" and each
+    outfit refers to them by id in "slots" order.
     """
     try:
         # Validate input structure
@@ -384,14 +615,21 @@ async def generate_outfits(slots: dict):
                 slots[slot] = []
 
         # Generate outfit combinations
-        outfits = generate_candidates(slots)
+        outfits = generate_candidates(slots, limit=limit, max_per_item=max_per_item)
 
-        return {
+        content = {
             "message": "Outfit combinations generated successfully",
-            "total_combinations": len(outfits),
-            "outfits": outfits
+            "total_combinations": len(outfits)
         }
+        if format == "compact":
+            content.update(compact_outfits(outfits))
+        else:
+            content["outfits"] = outfits
 
+        return json_response(request, content)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -414,13 +652,15 @@ async def extract_preferences_from_query(
             )
         
         # Extract preferences using the LLM
-        preferences = extract_style_preferences(query)
+        preferences = await run_llm(extract_style_preferences, query)
         
         return {
             "message": "Preferences extracted successfully",
             "preferences": preferences
         }
         
+    except (HTTPException, Overloaded, NoBackendAvailable):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -429,14 +669,19 @@ async def extract_preferences_from_query(
 
 @app.post("/outfits/score/")
 async def get_best_outfit(
+    request: Request,
     items: List[Dict],
     occasion: str = None,
     weather: str = None,
-    style_pref: str = None
+    style_pref: str = None,
+    limit: int = Query(10, description="Number of candidate outfits to score"),
+    format: str = Query("full", description="'full' embeds items in the best outfit, 'compact' returns an item table and id tuples")
 ):
     """
-    Generate all possible outfit combinations, score them, and return the best one.
+    Generate the most compatible outfit combinations, score them, and return the best one.
     Expects a list of clothing items from MongoDB.
+    With format=compact, every scored outfit is returned as an id tuple with
+    its score, alongside a deduplicated item table.
     """
     # try:
     if not items or not isinstance(items, list):
@@ -447,8 +692,8 @@ async def get_best_outfit(
     
     # Categorize the items
     slots = categorize(items)    
-    # Generate all possible combinations
-    outfits = generate_candidates(slots)
+    # Generate the most compatible combinations
+    outfits = generate_candidates(slots, limit=limit)
     
     if not outfits:
         raise HTTPException(
@@ -457,18 +702,24 @@ async def get_best_outfit(
         )
     
     # Score the outfits
-    score_outfits(outfits, occasion, weather, style_pref)
+    await run_llm(score_outfits, outfits, occasion, weather, style_pref)
     
     # Get the best outfit
     best_outfit = max(outfits, key=lambda x: x["score"])
     
-    return {
+    content = {
         "message": "Best outfit selected successfully",
-        "best_outfit": best_outfit,
         "total_combinations": len(outfits),
         "score": best_outfit["score"],
         "reason": best_outfit.get("reason", "")
     }
+    if format == "compact":
+        content["best_outfit_id"] = best_outfit["outfit_id"]
+        content.update(compact_outfits(outfits))
+    else:
+        content["best_outfit"] = best_outfit
+    
+    return json_response(request, content)
         
     # except HTTPException:
     #     raise
@@ -478,28 +729,241 @@ async def get_best_outfit(
     #         detail=f"Error selecting best outfit: {str(e)}"
     #     )
 
-# Add this after your other imports
-app.mount("/api/images", StaticFiles(directory=UPLOAD_FOLDER), name="images")
+@app.get("/outfits/recommend")
+async def recommend_outfits(
+    request: Request,
+    occasion: str = None,
+    weather: str = None,
+    style_pref: str = None,
+    query: str = Query(None, description="Natural language query, used when no context is given"),
+    limit: int = Query(RECOMMEND_TOP, description="Number of outfits to return"),
+    format: str = Query("full", description="'full' embeds items in each outfit, 'compact' returns an item table and id tuples")
+):
+    """
+    Recommend outfits for an (occasion, weather, style_pref) context from
+    the whole wardrobe. Contexts seen before are served from precomputed
+    results kept up to date as items are added, edited and removed; an
+    unseen context is computed live once and stored.
+    """
+    if query and not any([occasion, weather, style_pref]):
+        preferences = await run_llm(extract_style_preferences, query)
+        occasion = preferences.get("occasion")
+        weather = preferences.get("weather")
+        style_pref = preferences.get("style_pref")
+
+    try:
+        result = await run_llm(get_recommendations, occasion, weather, style_pref, limit=limit)
+    except (Overloaded, NoBackendAvailable):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error recommending outfits: {str(e)}"
+        )
+
+    outfits = result["outfits"]
+    if not outfits:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not generate any valid outfit combinations"
+        )
+
+    best_outfit = outfits[0]
+    content = {
+        "message": "Outfits recommended successfully",
+        "context": result["context"],
+        "source": result["source"],
+        "total_combinations": len(outfits),
+        "score": best_outfit["score"],
+        "reason": best_outfit.get("reason", "")
+    }
+    if format == "compact":
+        content["best_outfit_id"] = best_outfit["outfit_id"]
+        content.update(compact_outfits(outfits))
+    else:
+        content["best_outfit"] = best_outfit
+        content["outfits"] = outfits
+
+    return json_response(request, content)
+
+@app.get("/outfits/{outfit_id}/explain")
+async def explain_outfit_endpoint(outfit_id: str):
+    """
+    Stream a stylist explanation for one outfit as server-sent events.
+    The outfit id is the one returned with generated and scored outfits.
+    Each event carries a {"delta": ...} text chunk, followed by a final
+    "done" event. Finished explanations are cached per outfit id and
+    the current contents of its items.
+    """
+    try:
+        slot_ids = parse_outfit_id(outfit_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = get_items_by_ids([i for i in slot_ids.values() if i])
+    outfit = {}
+    for slot, item_id in slot_ids.items():
+        if item_id and item_id not in items:
+            raise HTTPException(status_code=404, detail=f"Item not found: {item_id}")
+        outfit[slot] = items.get(item_id) if item_id else None
+
+    # Pull the first event before responding so that a shed request still
+    # gets a proper 429 instead of a broken stream.
+    events = explanation_events(outfit)
+    first = await run_llm(next, events, None)
+
+    def stream():
+        if first is not None:
+            yield first
+        yield from events
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.post("/outfits/plan")
+async def plan_outfits_endpoint(
+    days: List[Dict],
+    style_pref: str = None,
+    query: str = None,
+    rotation_gap: int = Query(2, description="Minimum days between wearing the same item"),
+    use_llm: bool = Query(False, description="Re-score the top outfits of each context with the LLM")
+):
+    """
+    Plan outfits for several days in one pass.
+    Expects a list of entries like {"date": "2024-05-01", "occasion": "office", "weather": "rainy"}.
+    Candidates are retrieved and scored once for the whole plan, and outfits
+    are assigned without repeats and with item rotation across days.
+    """
+    if not days or not isinstance(days, list):
+        raise HTTPException(
+            status_code=400,
+            detail="Input must be a non-empty list of days"
+        )
+
+    try:
+        result = await run_llm(
+            plan_outfits,
+            days,
+            style_pref=style_pref,
+            query=query,
+            rotation_gap=rotation_gap,
+            use_llm=use_llm
+        )
+    except (Overloaded, NoBackendAvailable):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error planning outfits: {str(e)}"
+        )
+
+    if not result["days"]:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not generate any valid outfit combinations"
+        )
+
+    return {
+        "message": "Outfit plan created successfully",
+        "total_days": len(result["days"]),
+        "plan": result["days"],
+        "searches": result["searches"],
+        "llm_calls": result["llm_calls"]
+    }
+
+@app.post("/internal/llm/chat")
+async def internal_llm_chat(request: Request, body: dict, x_admin_token: str = Header(None)):
+    """
+    Run an LLM call for a jobs.py worker process through this process's
+    scheduler and backend pool, so that worker processes share the same
+    priority classes, caps and backend slots as the API.
+
+    Callers must send ADMIN_TOKEN; without one configured, only clients on
+    this machine are accepted.
+    """
+    if os.getenv("ADMIN_TOKEN"):
+        require_admin(x_admin_token)
+    elif not request.client or request.client.host not in loopback_hosts:
+        raise HTTPException(status_code=403, detail="Set ADMIN_TOKEN to accept workers from other hosts")
+    priority = body.get("priority", BULK)
+    if priority not in priority_rank or "payload" not in body:
+        raise HTTPException(status_code=400, detail="Expected a payload and a known priority")
+    payload = body["payload"]
+    kind = body.get("kind", "text")
+    return await run_llm(
+        scheduler.run,
+        lambda: pool.chat(payload, kind=kind),
+        priority,
+        request_key(payload, kind),
+        priority=priority
+    )
+
+@app.get("/llm/backends")
+async def get_llm_backends():
+    """
+    Report the state of every LLM backend in the pool: health, slots,
+    in-flight requests and observed latency.
+    """
+    return {"backends": pool.status()}
+
+@app.get("/metrics/llm")
+async def get_llm_metrics():
+    """
+    Report LLM scheduler metrics: queue depth and running work per priority
+    class, queue wait times, and counts of rejected, expired and coalesced calls.
+    """
+    return scheduler.metrics()
+
+@app.get("/admin/profiles")
+async def get_profiles(x_admin_token: str = Header(None)):
+    """List stored request profiles, newest first."""
+    require_admin(x_admin_token)
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: str = Header(None)):
+    """
+    Per-function breakdown of one profile, overall and for the processor,
+    ask_llm, database and v_database modules.
+    """
+    require_admin(x_admin_token)
+    path = profiling.profile_path(profile_id, ".json")
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/admin/profiles/{profile_id}/folded")
+async def download_profile(profile_id: str, x_admin_token: str = Header(None)):
+    """Download a profile as folded stacks for flamegraph.pl or speedscope."""
+    require_admin(x_admin_token)
+    path = profiling.profile_path(profile_id, ".folded")
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
 
 @app.get("/api/wardrobe", response_model=List[Dict[str, Any]])
-async def get_wardrobe_items():
+async def get_wardrobe_items(request: Request):
     """
     Retrieve all clothing items with their image paths and body parts.
     Returns a list of dictionaries containing 'image_path' and 'body_part' for each item.
     """
     try:
-        # Get all items from the clothes collection, projecting only the required fields
-        items = list(clothes.find(
-            {},
-            {
-                "image_path": 1,
-                "body_part": 1,
-                "category": 1,
-                "_id": 0  # Exclude the _id field from the response
-            }
-        ))
+        def compute():
+            # Get all items from the clothes collection, projecting only the required fields
+            return list(clothes.find(
+                {},
+                {
+                    "image_path": 1,
+                    "body_part": 1,
+                    "category": 1,
+                    "_id": 0  # Exclude the _id field from the response
+                }
+            ))
 
-        return items
+        return versioned_response(request, "wardrobe", {}, compute)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -508,8 +972,16 @@ async def get_wardrobe_items():
 
 @app.get("/api/images/{filename}")
 async def get_image(filename: str):
-    """Serve images from the wardrobe_images directory"""
-    image_path = os.path.join(UPLOAD_FOLDER, filename)  # Use UPLOAD_FOLDER here
-    if not os.path.exists(image_path):
+    """
+    Serve an image by the file name at the end of an item's image_path.
+    Content-addressed images never change, so browsers may cache them forever.
+    """
+    ref = image_store.ref_for_name(filename)
+    if ref is None or not await run_in_threadpool(image_store.exists, ref):
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(image_path)
\ No newline at end of file
+    if not is_key(ref):
+        return FileResponse(ref)
+    if isinstance(image_store, LocalImageStore):
+        return FileResponse(image_store.path(ref), headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    # Let the bucket serve the bytes
+    return RedirectResponse(image_store.url(ref))
\ No newline at end of file
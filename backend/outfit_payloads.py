@@ -0,0 +1,84 @@
+import gzip
+import json
+from fastapi import Request
+from fastapi.responses import Response
+from outfit_search import SLOTS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Payloads smaller than this are not worth compressing.
+MIN_COMPRESS_SIZE = 1024
+
+
+def encode_json(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=str)
+    return json.dumps(content, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return {name for name, q in accepted.items() if q > 0}
+
+
+def json_response(request: Request, content, status_code=200):
+    """
+    Serialize content with the fast encoder and compress it with brotli or
+    gzip when the client accepts it and the body is large enough.
+    """
+    body = encode_json(content)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= MIN_COMPRESS_SIZE:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=4)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def compact_outfits(outfits):
+    """
+    Normalize outfits into a deduplicated item table plus outfits that refer
+    to items by id, in SLOTS order (null for an empty slot).
+    """
+    items = {}
+    rows = []
+    for outfit in outfits:
+        ids = []
+        for slot in SLOTS:
+            item = outfit.get(slot)
+            if item:
+                item_id = str(item["_id"])
+                items.setdefault(item_id, item)
+                ids.append(item_id)
+            else:
+                ids.append(None)
+        row = {"ids": ids}
+        for field in ["outfit_id", "compatibility", "score", "reason"]:
+            if field in outfit:
+                row[field] = outfit[field]
+        rows.append(row)
+    return {"slots": SLOTS, "items": items, "outfits": rows}
@@ -0,0 +1,262 @@
+import math
+import numpy as np
+from colors import harmony_table
+
+SLOTS = ["top", "bottom", "shoes", "outerwear"]
+OPTIONAL_SLOTS = {"shoes", "outerwear"}
+
+# Score given to a pair (or a prior) when one side is an empty optional slot,
+# so that leaving outerwear off is neither rewarded nor ruled out.
+NEUTRAL = 0.5
+
+PAIR_WEIGHTS = {
+    "formality": 0.3,
+    "seasons": 0.15,
+    "occasions": 0.15,
+    "style_tags": 0.2,
+    "color": 0.2,
+}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip().lower() for v in value.split(",") if v.strip()]
+    return [str(v).strip().lower() for v in value if v]
+
+
+def _formality(items):
+    values = []
+    for item in items:
+        try:
+            values.append(float(item.get("formality_level") or 3))
+        except (TypeError, ValueError):
+            values.append(3.0)
+    return np.array(values, dtype=np.float32)
+
+
+def _tag_matrix(items, field, vocab):
+    matrix = np.zeros((len(items), len(vocab)), dtype=np.float32)
+    for row, item in enumerate(items):
+        for tag in _as_list(item.get(field)):
+            matrix[row, vocab[tag]] = 1.0
+    return matrix
+
+
+def _jaccard(a, b):
+    overlap = a @ b.T
+    union = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :] - overlap
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(union > 0, overlap / union, NEUTRAL)
+    return score
+
+
+def _season_match(a, b, all_col):
+    overlap = (a @ b.T) > 0
+    if all_col is not None:
+        overlap |= (a[:, all_col][:, None] > 0) | (b[:, all_col][None, :] > 0)
+    empty = (a.sum(axis=1)[:, None] == 0) | (b.sum(axis=1)[None, :] == 0)
+    return np.where(empty, NEUTRAL, overlap.astype(np.float32))
+
+
+def item_priors(items):
+    """
+    Per-item prior in [0, 1]. Uses the Marqo relevance score when the item
+    carries one, otherwise decays with the item's rank in the slot list.
+    """
+    scores = [item.get("_score") for item in items]
+    if items and all(isinstance(s, (int, float)) for s in scores):
+        arr = np.array(scores, dtype=np.float32)
+        span = arr.max() - arr.min()
+        if span > 0:
+            return (arr - arr.min()) / span
+        return np.ones(len(items), dtype=np.float32)
+    return 1.0 / (1.0 + 0.05 * np.arange(len(items), dtype=np.float32))
+
+
+def pairwise_table(items_a, items_b):
+    """
+    Compatibility of every item in items_a with every item in items_b,
+    as a len(items_a) x len(items_b) array of values in [0, 1].
+    """
+    if not items_a or not items_b:
+        return np.zeros((len(items_a), len(items_b)), dtype=np.float32)
+
+    formality = 1.0 - np.abs(_formality(items_a)[:, None] - _formality(items_b)[None, :]) / 4.0
+    table = PAIR_WEIGHTS["formality"] * np.clip(formality, 0.0, 1.0)
+
+    for field in ["seasons", "occasions", "style_tags"]:
+        tags = sorted({t for item in items_a + items_b for t in _as_list(item.get(field))})
+        vocab = {t: i for i, t in enumerate(tags)}
+        a = _tag_matrix(items_a, field, vocab)
+        b = _tag_matrix(items_b, field, vocab)
+        if field == "seasons":
+            match = _season_match(a, b, vocab.get("all"))
+        else:
+            match = _jaccard(a, b)
+        table = table + PAIR_WEIGHTS[field] * match
+
+    table = table + PAIR_WEIGHTS["color"] * harmony_table(items_a, items_b, neutral=NEUTRAL)
+
+    return table.astype(np.float32)
+
+
+def build_tables(slots):
+    """
+    Precompute the pairwise compatibility tables for every pair of slots.
+    Returns a dict keyed by (slot_a, slot_b) following SLOTS order.
+    """
+    tables = {}
+    for i, a in enumerate(SLOTS):
+        for b in SLOTS[i + 1:]:
+            tables[(a, b)] = pairwise_table(slots.get(a) or [], slots.get(b) or [])
+    return tables
+
+
+def outfit_compatibility(outfit):
+    """
+    Pairwise compatibility of a single outfit: the mean table score over
+    every slot pair, with NEUTRAL for pairs involving an empty slot.
+    Unlike search_outfits' compatibility it carries no item priors, so it
+    can be compared across searches.
+    """
+    scores = []
+    for i, a in enumerate(SLOTS):
+        for b in SLOTS[i + 1:]:
+            if outfit.get(a) and outfit.get(b):
+                scores.append(float(pairwise_table([outfit[a]], [outfit[b]])[0, 0]))
+            else:
+                scores.append(NEUTRAL)
+    return sum(scores) / len(scores)
+
+
+def outfit_id(outfit):
+    """Stable id for an outfit: its item ids in slot order, joined by "_"."""
+    return "_".join(str(outfit[slot]["_id"]) if outfit.get(slot) else "" for slot in SLOTS)
+
+
+def parse_outfit_id(value):
+    """Map an outfit id back to {slot: item_id or None}."""
+    parts = value.split("_")
+    if len(parts) != len(SLOTS):
+        raise ValueError(f"Outfit id must have {len(SLOTS)} parts")
+    return {slot: part or None for slot, part in zip(SLOTS, parts)}
+
+
+def _prune(scores, root, width, per_root):
+    order = np.argsort(-scores, kind="stable")
+    if per_root is None:
+        return order[:width]
+    keep = []
+    counts = {}
+    for idx in order:
+        r = int(root[idx])
+        if counts.get(r, 0) >= per_root:
+            continue
+        counts[r] = counts.get(r, 0) + 1
+        keep.append(idx)
+        if len(keep) >= width:
+            break
+    return np.array(keep, dtype=np.int64)
+
+
+def _pick_diverse(states, scores, limit, max_per_item):
+    order = np.argsort(-scores, kind="stable")
+    picked = []
+    usage = {}
+    for idx in order:
+        keys = [(s, int(i)) for s, i in enumerate(states[idx]) if i >= 0]
+        if max_per_item is not None and any(usage.get(k, 0) >= max_per_item for k in keys):
+            continue
+        for k in keys:
+            usage[k] = usage.get(k, 0) + 1
+        picked.append(idx)
+        if len(picked) >= limit:
+            return picked
+    # Not enough diverse outfits in the beam; fill up with the best of the rest.
+    for idx in order:
+        if idx not in picked:
+            picked.append(idx)
+            if len(picked) >= limit:
+                break
+    return picked
+
+
+def search_outfits(slots, limit=10, beam_width=None, max_per_item=2,
+                   optional=OPTIONAL_SLOTS, tables=None):
+    """
+    Beam search over per-slot candidate lists for the best `limit` outfits.
+
+    Args:
+        slots (dict): Items per slot, as returned by processor.categorize
+        limit (int): Number of outfits to return
+        beam_width (int, optional): Partial outfits kept after each slot
+        max_per_item (int, optional): How many returned outfits may share an item
+        optional (set): Slots that may be left empty
+        tables (dict, optional): Precomputed tables from build_tables
+
+    Returns:
+        list: Outfit dicts with an item (or None) per slot and a
+        "compatibility" score in [0, 1], best first
+    """
+    if limit <= 0:
+        return []
+    for slot in SLOTS:
+        if slot not in optional and not slots.get(slot):
+            return []
+
+    if tables is None:
+        tables = build_tables(slots)
+    if beam_width is None:
+        beam_width = max(64, limit * 8)
+
+    priors = {slot: item_priors(slots.get(slot) or []) for slot in SLOTS}
+    root_count = max(1, len(slots.get(SLOTS[0]) or []))
+    per_root = max(2, math.ceil(beam_width / root_count)) if max_per_item is not None else None
+
+    states = np.zeros((1, 0), dtype=np.int64)
+    scores = np.zeros(1, dtype=np.float32)
+
+    for depth, slot in enumerate(SLOTS):
+        n = len(slots.get(slot) or [])
+        # Candidate increments for every (state, item) pair.
+        inc = np.repeat(priors[slot][None, :], len(states), axis=0) if n else np.zeros((len(states), 0), dtype=np.float32)
+        for prev_depth, prev in enumerate(SLOTS[:depth]):
+            if not n:
+                break
+            prev_idx = states[:, prev_depth]
+            rows = tables[(prev, slot)][np.clip(prev_idx, 0, None)] if len(tables[(prev, slot)]) else np.zeros((len(states), n), dtype=np.float32)
+            inc = inc + np.where((prev_idx >= 0)[:, None], rows, NEUTRAL)
+
+        choices = [inc]
+        indices = [np.arange(n)]
+        if slot in optional:
+            choices.append(np.full((len(states), 1), NEUTRAL * (depth + 1), dtype=np.float32))
+            indices.append(np.array([-1]))
+        inc = np.concatenate(choices, axis=1)
+        idx = np.concatenate(indices)
+
+        total = (scores[:, None] + inc).ravel()
+        parent = np.repeat(np.arange(len(states)), len(idx))
+        child = np.tile(idx, len(states))
+        new_states = np.concatenate([states[parent], child[:, None]], axis=1)
+
+        root = new_states[:, 0]
+        keep = _prune(total, root, beam_width, per_root)
+        states, scores = new_states[keep], total[keep]
+
+    # Every outfit accumulates one prior per slot and one term per slot pair.
+    terms = len(SLOTS) + len(SLOTS) * (len(SLOTS) - 1) // 2
+    picked = _pick_diverse(states, scores, limit, max_per_item)
+
+    outfits = []
+    for i in picked:
+        outfit = {}
+        for depth, slot in enumerate(SLOTS):
+            j = int(states[i, depth])
+            outfit[slot] = slots[slot][j] if j >= 0 else None
+        outfit["compatibility"] = round(float(scores[i]) / terms, 4)
+        outfit["outfit_id"] = outfit_id(outfit)
+        outfits.append(outfit)
+    return outfits
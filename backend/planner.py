@@ -0,0 +1,186 @@
+from datetime import date, datetime
+from database import get_items_by_ids
+from v_database import get_style_candidates
+from processor import categorize, context_score
+from outfit_search import SLOTS, search_outfits
+from ask_llm import score_outfit
+
+body_parts = ["upper", "lower", "footwear", "outerwear"]
+
+
+def _context(day):
+    return (day.get("occasion") or None, day.get("weather") or None)
+
+
+def _day_number(day):
+    """Ordinal of a day's date, or None if it has no parseable date."""
+    value = day.get("date")
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal() if value else None
+    except ValueError:
+        return None
+
+
+def _day_order(days):
+    """Dated days in date order, then undated days in the order given."""
+    numbers = [_day_number(day) for day in days]
+    return sorted(
+        range(len(days)),
+        key=lambda i: (0, numbers[i], i) if numbers[i] is not None else (1, 0, i),
+    )
+
+
+def build_pool(days, style_pref=None, query=None, limit=30):
+    """
+    Retrieve one shared candidate pool for every day in the plan.
+    Runs one Marqo search per body part and one Mongo query in total.
+    """
+    terms = []
+    for occasion, weather in {_context(d) for d in days}:
+        terms.extend(t for t in (occasion, weather) if t)
+    terms = sorted(set(terms))
+    if style_pref:
+        terms.append(style_pref)
+    pool_query = " ".join(filter(None, [query, "outfit for", " ".join(terms)]))
+
+    hits = []
+    for part in body_parts:
+        hits.extend(get_style_candidates(pool_query, body_part=part, limit=limit))
+
+    by_id = get_items_by_ids([hit["id"] for hit in hits])
+    items = []
+    seen = set()
+    for hit in hits:
+        item = by_id.get(hit["id"])
+        if item is None or hit["id"] in seen:
+            continue
+        seen.add(hit["id"])
+        items.append({**item, "_score": hit.get("_score")})
+    return items, len(body_parts)
+
+
+def _assign(days, shortlist, scores, rotation_gap):
+    """
+    Assign one outfit per day in a single greedy pass over all (day, outfit)
+    pairs, best score first. An outfit is used at most once and an item is
+    not worn again within rotation_gap days, counted by calendar date when
+    both days have one and by position in the plan otherwise. Days left
+    over after the strict pass get their best remaining outfit with the
+    rotation rule relaxed.
+    """
+    numbers = [_day_number(day) for day in days]
+
+    def gap(a, b):
+        if numbers[a] is not None and numbers[b] is not None:
+            return abs(numbers[a] - numbers[b])
+        return abs(a - b)
+
+    pairs = sorted(
+        ((scores[d][o], d, o) for d in range(len(days)) for o in range(len(shortlist))),
+        reverse=True,
+    )
+    assigned = {}
+    used_outfits = set()
+    worn = {}
+
+    def fits(d, o):
+        for slot in SLOTS:
+            item = shortlist[o].get(slot)
+            if item and any(gap(d, other) < rotation_gap for other in worn.get(item["_id"], [])):
+                return False
+        return True
+
+    def take(d, o):
+        assigned[d] = o
+        used_outfits.add(o)
+        for slot in SLOTS:
+            item = shortlist[o].get(slot)
+            if item:
+                worn.setdefault(item["_id"], []).append(d)
+
+    for _, d, o in pairs:
+        if d in assigned or o in used_outfits:
+            continue
+        if fits(d, o):
+            take(d, o)
+
+    for d in range(len(days)):
+        if d in assigned:
+            continue
+        options = [o for o in range(len(shortlist)) if o not in used_outfits] or range(len(shortlist))
+        take(d, max(options, key=lambda o: scores[d][o]))
+
+    return assigned
+
+
+def plan_outfits(days, style_pref=None, query=None, shortlist_size=40,
+                 rotation_gap=2, use_llm=False, llm_top=5):
+    """
+    Plan outfits for several days at once.
+
+    Retrieval, hydration and compatibility search run once for the whole
+    plan. Each distinct (occasion, weather) context is scored once, so days
+    that share a context share the work. With use_llm the top llm_top
+    outfits of each distinct context are re-scored by the LLM.
+
+    Args:
+        days (list): Dicts with "date", "occasion" and "weather"
+        style_pref (str, optional): Style preference applied to every day
+        query (str, optional): Extra free text for retrieval
+        shortlist_size (int): Outfits considered for assignment
+        rotation_gap (int): Minimum days between wearing the same item
+        use_llm (bool): Re-score each context's top outfits with the LLM
+        llm_top (int): Outfits re-scored per context when use_llm is set
+
+    Returns:
+        dict: The per-day plan plus counts of search and LLM calls made
+    """
+    days = [days[i] for i in _day_order(days)]
+
+    items, searches = build_pool(days, style_pref=style_pref, query=query)
+    slots = categorize(items)
+    shortlist = search_outfits(
+        slots,
+        limit=max(shortlist_size, len(days)),
+        max_per_item=max(2, len(days) // 2),
+    )
+    if not shortlist:
+        return {"days": [], "searches": searches, "llm_calls": 0}
+
+    llm_calls = 0
+    context_scores = {}
+    for context in {_context(d) for d in days}:
+        occasion, weather = context
+        row = [
+            0.5 * o["compatibility"] + 0.5 * context_score(o, occasion, weather, style_pref)
+            for o in shortlist
+        ]
+        if use_llm:
+            best = sorted(range(len(shortlist)), key=lambda i: row[i], reverse=True)[:llm_top]
+            for i in best:
+                result = score_outfit(shortlist[i], occasion, weather, style_pref)
+                llm_calls += 1
+                # overall_score is on a 1-10 scale
+                row[i] = 0.5 * row[i] + 0.05 * float(result["overall_score"])
+        context_scores[context] = row
+
+    scores = [context_scores[_context(d)] for d in days]
+    assigned = _assign(days, shortlist, scores, rotation_gap)
+
+    plan = []
+    for d, day in enumerate(days):
+        outfit = shortlist[assigned[d]]
+        plan.append({
+            "date": day.get("date"),
+            "occasion": day.get("occasion"),
+            "weather": day.get("weather"),
+            "outfit": {slot: outfit.get(slot) for slot in SLOTS},
+            "outfit_id": outfit["outfit_id"],
+            "score": round(scores[d][assigned[d]], 4),
+        })
+
+    return {"days": plan, "searches": searches, "llm_calls": llm_calls}
@@ -1,11 +1,12 @@
 import os
 import json
 import uuid
-import itertools
 from ask_llm import analyze_clothing, score_outfit
 from database import save_item_to_db
 from v_database import save_to_marqo
-from utilities import top_n
+from outfit_search import search_outfits
+from colors import outfit_harmony
+from llm_scheduler import INTERACTIVE
 
 def process_image(img_path):
     id = str(uuid.uuid4())
@@ -29,28 +30,70 @@ def categorize(items):
                 slots["outerwear"].append(i)
     return slots
 
-def generate_candidates(slots):
-    tops = top_n(slots["top"])
-    print(tops, 'tops')
-    bottoms = top_n(slots["bottom"])
-    shoes = top_n(slots["shoes"])
-    print(shoes, 'shoes')
-    outerwear = top_n(slots["outerwear"])
-    outfits = []
-    for t, b, s, o in itertools.product(tops, bottoms, shoes, outerwear):
-        outfits.append({
-                "top": t,
-                "bottom": b,
-                "shoes": s,
-                "outerwear": o,
-            })
-
-    return outfits
-
-def score_outfits(outfits, occasion, weather, style_pref):
+def generate_candidates(slots, limit=20, max_per_item=2):
+    return search_outfits(slots, limit=limit, max_per_item=max_per_item)
+
+def score_outfits(outfits, occasion, weather, style_pref, priority=INTERACTIVE):
     for outfit in outfits:
-        result = score_outfit(outfit, occasion, weather, style_pref)
-        outfit["score"] = result["overall_score"]
+        result = score_outfit(outfit, occasion, weather, style_pref, priority=priority)
+        # Color harmony comes from the stored palettes, not the LLM.
+        harmony = outfit_harmony(outfit)
+        outfit["color_harmony"] = harmony
+        if harmony is None:
+            outfit["score"] = result["overall_score"]
+        else:
+            outfit["score"] = round(0.8 * float(result["overall_score"]) + 2.0 * harmony, 2)
         outfit["reason"] = result["reason"]
     best_outfit = max(outfits, key=lambda x: x["score"])
-    return best_outfit
\ No newline at end of file
+    return best_outfit
+
+weather_seasons = {
+    "hot": {"summer"},
+    "warm": {"summer"},
+    "sunny": {"summer"},
+    "cold": {"winter"},
+    "snowy": {"winter"},
+    "windy": {"winter", "monsoon"},
+    "rainy": {"monsoon"},
+}
+
+def _tags(item, field):
+    value = item.get(field) or []
+    if isinstance(value, str):
+        value = value.split(",")
+    return {v.strip().lower() for v in value if v and v.strip()}
+
+def context_score(outfit, occasion=None, weather=None, style_pref=None):
+    """
+    Score how well an outfit's tags fit an (occasion, weather, style_pref)
+    context without calling the LLM: the mean item_context_score of its
+    items, plus an outerwear check in bad weather. Returns a value in [0, 1].
+    """
+    items = [outfit[slot] for slot in ["top", "bottom", "shoes", "outerwear"] if outfit.get(slot)]
+    if not items:
+        return 0.0
+    checks = sum(1 for value in (occasion, weather, style_pref) if value)
+    if not checks:
+        return 0.5
+    score = sum(item_context_score(i, occasion, weather, style_pref) for i in items) / len(items)
+    if weather and weather.lower() in {"cold", "snowy", "windy", "rainy"}:
+        # Weighted as one more check alongside the per-item ones.
+        return (checks * score + (1.0 if outfit.get("outerwear") else 0.0)) / (checks + 1)
+    return score
+
+def item_context_score(item, occasion=None, weather=None, style_pref=None):
+    """
+    How well a single item's tags fit a context, in [0, 1]: the share of
+    the given occasion, weather and style_pref checks it passes.
+    """
+    checks = []
+    if occasion:
+        checks.append(float(occasion.lower() in _tags(item, "occasions")))
+    if weather:
+        seasons = weather_seasons.get(weather.lower(), set()) | {"all"}
+        checks.append(float(bool(seasons & _tags(item, "seasons"))))
+    if style_pref:
+        checks.append(float(style_pref.lower() in _tags(item, "style_tags")))
+    if not checks:
+        return 0.5
+    return sum(checks) / len(checks)
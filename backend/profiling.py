@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import Counter
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+
+load_dotenv()
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+# Code paths broken out per function in every profile summary.
+tracked_modules = ["processor", "ask_llm", "database", "v_database"]
+
+# Leaf frames that mean a thread is parked rather than doing work.
+idle_leaves = {
+    ("threading", "wait"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+    ("asyncio.base_events", "_run_once"),
+}
+
+
+# The sampler of the request being handled, carried into its tasks and
+# threadpool calls.
+_current = contextvars.ContextVar("profile_sampler", default=None)
+
+
+# Root frame added to stacks sampled from a thread that other requests
+# share (the event loop), so they can be told apart or filtered out.
+shared_root = ("event_loop", "shared")
+
+
+def _label(frame):
+    return frame.f_globals.get("__name__", "?"), frame.f_code.co_name
+
+
+class Sampler:
+    """
+    Statistical profiler: a background thread snapshots the stacks of the
+    threads working on one request at a fixed interval and counts identical
+    stacks. Threads join with track(); other requests' worker threads and
+    background threads (pool health checks, tagging workers) are never
+    sampled. The event loop thread runs every request's async code, so its
+    stacks may belong to concurrent requests; they are tracked as shared and
+    sit under shared_root. Cheap enough to leave on for latency-triggered
+    capture.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.threads = set()
+        self.shared = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @contextmanager
+    def track(self, shared=False):
+        """
+        Sample the calling thread until the block exits. shared marks a
+        thread that also runs other requests' work.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            added = ident not in self.threads
+            self.threads.add(ident)
+            if added and shared:
+                self.shared.add(ident)
+        try:
+            yield
+        finally:
+            if added:
+                with self._lock:
+                    self.threads.discard(ident)
+                    self.shared.discard(ident)
+
+    @contextmanager
+    def activate(self):
+        """Make this the current request's sampler, for run_in_threadpool."""
+        token = _current.set(self)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            with self._lock:
+                threads = [(ident, ident in self.shared) for ident in self.threads]
+            frames = sys._current_frames()
+            for ident, shared in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame))
+                    frame = frame.f_back
+                if not stack or stack[0] in idle_leaves:
+                    continue
+                if shared:
+                    stack.append(shared_root)
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def folded(self):
+        """Stacks in the folded format read by flamegraph.pl and speedscope."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(f"{m}.{f}" for m, f in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def breakdown(self, top=25):
+        """Self and total sample counts per function, overall and per tracked module."""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        def rows(labels):
+            ranked = sorted(labels, key=lambda l: (total_counts[l], self_counts[l]), reverse=True)
+            return [
+                {
+                    "function": f"{m}.{f}",
+                    "self": self_counts[(m, f)],
+                    "total": total_counts[(m, f)],
+                    "total_seconds": round(total_counts[(m, f)] * self.interval, 4),
+                }
+                for m, f in ranked[:top]
+            ]
+
+        return {
+            "shared_samples": total_counts[shared_root],
+            "top": rows(total_counts),
+            "modules": {
+                module: rows([l for l in total_counts if l[0] == module])
+                for module in tracked_modules
+            },
+        }
+
+
+def tracked(fn):
+    """
+    fn, wrapped so that when the current request is being profiled, the
+    thread that runs it is sampled for the duration of the call.
+    """
+    sampler = _current.get()
+    if sampler is None:
+        return fn
+
+    def call(*args, **kwargs):
+        with sampler.track():
+            return fn(*args, **kwargs)
+
+    return call
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """Starlette's run_in_threadpool, with the worker thread profiled (see tracked)."""
+    return await _run_in_threadpool(tracked(fn), *args, **kwargs)
+
+
+def should_profile(request):
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() not in {"0", "false", "no", ""}
+
+
+def save_profile(sampler, method, path, duration, status_code, reason):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    summary = {
+        "id": profile_id,
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "reason": reason,
+        "duration_ms": round(duration * 1000, 1),
+        "interval_ms": sampler.interval * 1000,
+        "samples": sampler.samples,
+        "created_at": time.time(),
+        **sampler.breakdown(),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w") as f:
+        f.write(sampler.folded())
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    _prune()
+    return profile_id
+
+
+def _prune():
+    summaries = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for name in summaries[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for ext in (".json", ".folded"):
+            path = os.path.join(PROFILE_DIR, name[:-len(".json")] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(PROFILE_DIR, name)) as f:
+            summary = json.load(f)
+        profiles.append({k: summary[k] for k in ["id", "method", "path", "status_code", "reason", "duration_ms", "samples", "created_at"]})
+    return profiles
+
+
+def profile_path(profile_id, ext):
+    # Ids are generated by save_profile; refuse anything that could leave PROFILE_DIR.
+    if os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{ext}")
+    return path if os.path.exists(path) else None
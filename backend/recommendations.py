@@ -0,0 +1,386 @@
+import os
+import time
+from dotenv import load_dotenv
+from database import clothes, recommendations, get_items_by_ids
+from processor import categorize, context_score, item_context_score, score_outfits
+from outfit_search import SLOTS, OPTIONAL_SLOTS, search_outfits, outfit_compatibility, outfit_id
+from llm_scheduler import INTERACTIVE, BULK
+
+load_dotenv()
+
+# Outfits kept per context, all scored by the LLM, and locally scored
+# runners-up kept to refill the list when an item is removed.
+RECOMMEND_TOP = int(os.getenv("RECOMMEND_TOP", "10"))
+RECOMMEND_RESERVE = int(os.getenv("RECOMMEND_RESERVE", "30"))
+MAX_PER_ITEM = 2
+
+# Every stored context is updated on each item change, so only the common
+# contexts plus the RECOMMEND_MAX_CONTEXTS most requested others are kept,
+# and a context unused for RECOMMEND_CONTEXT_TTL_DAYS is dropped. A dropped
+# context is rebuilt live the next time it is requested.
+RECOMMEND_MAX_CONTEXTS = int(os.getenv("RECOMMEND_MAX_CONTEXTS", "50"))
+RECOMMEND_CONTEXT_TTL = float(os.getenv("RECOMMEND_CONTEXT_TTL_DAYS", "14")) * 86400
+
+# There are no accounts yet; every wardrobe belongs to this user.
+DEFAULT_USER = "default"
+
+# Contexts built in the background when the API starts (and by
+# `python recommendations.py`). Any other context is built the first time
+# it is requested.
+common_contexts = [
+    {"occasion": "casual", "weather": None, "style_pref": None},
+    {"occasion": "business", "weather": None, "style_pref": None},
+    {"occasion": "formal", "weather": None, "style_pref": None},
+    {"occasion": "party", "weather": None, "style_pref": None},
+    {"occasion": "date", "weather": None, "style_pref": None},
+    {"occasion": "wedding", "weather": None, "style_pref": None},
+]
+
+context_fields = ["occasion", "weather", "style_pref"]
+
+
+def normalize_context(occasion=None, weather=None, style_pref=None):
+    """Lowercase and collapse a context; missing or "null" values become None."""
+    def clean(value):
+        value = " ".join(str(value).lower().split()) if value else ""
+        return None if value in ("", "null", "none", "any") else value
+
+    return {"occasion": clean(occasion), "weather": clean(weather), "style_pref": clean(style_pref)}
+
+
+def context_key(context, user=DEFAULT_USER):
+    return ":".join([user] + [context[field] or "*" for field in context_fields])
+
+
+def _wardrobe():
+    return {item["_id"]: item for item in clothes.find({})}
+
+
+def _slots(wardrobe, context):
+    # Items that suit the context rank higher within their slot.
+    return categorize([
+        {**item, "_score": item_context_score(item, **context)}
+        for item in wardrobe.values()
+    ])
+
+
+def _entry(outfit, context):
+    """Stored form of an outfit: item ids per slot plus its local scores."""
+    compatibility = outfit_compatibility(outfit)
+    return {
+        "outfit_id": outfit_id(outfit),
+        "ids": {slot: outfit[slot]["_id"] if outfit.get(slot) else None for slot in SLOTS},
+        "compatibility": round(compatibility, 4),
+        "fit": round(0.5 * compatibility + 0.5 * context_score(outfit, **context), 4),
+    }
+
+
+def _hydrate(entry, items):
+    """Rebuild an outfit from an entry, or None if one of its items is gone."""
+    outfit = {}
+    for slot, item_id in entry["ids"].items():
+        if item_id and item_id not in items:
+            return None
+        outfit[slot] = items[item_id] if item_id else None
+    for field in ["outfit_id", "compatibility", "score", "reason", "color_harmony"]:
+        if field in entry:
+            outfit[field] = entry[field]
+    return outfit
+
+
+def _select(entries, size):
+    """
+    Split entries into the best `size` by fit, with no item in more than
+    MAX_PER_ITEM of them where the wardrobe allows, and the rest.
+    """
+    unique = {}
+    for entry in sorted(entries, key=lambda e: e["fit"], reverse=True):
+        unique.setdefault(entry["outfit_id"], entry)
+
+    top, rest, usage = [], [], {}
+    for entry in unique.values():
+        ids = [i for i in entry["ids"].values() if i]
+        if len(top) < size and all(usage.get(i, 0) < MAX_PER_ITEM for i in ids):
+            top.append(entry)
+            for i in ids:
+                usage[i] = usage.get(i, 0) + 1
+        else:
+            rest.append(entry)
+    while len(top) < size and rest:
+        top.append(rest.pop(0))
+    return top, rest
+
+
+score_fields = ["score", "reason", "color_harmony"]
+
+
+def _score(entries, wardrobe, context, priority):
+    """LLM-score entries in place."""
+    outfits = [_hydrate(e, wardrobe) for e in entries]
+    score_outfits(outfits, context["occasion"], context["weather"], context["style_pref"], priority=priority)
+    for entry, outfit in zip(entries, outfits):
+        for field in score_fields:
+            entry[field] = outfit[field]
+
+
+def _split(entries, wardrobe, scores=None):
+    """
+    Top list and reserve for a set of entries. Top entries pick up scores
+    computed earlier; those still unscored are returned as pending.
+    """
+    entries = [e for e in entries if _hydrate(e, wardrobe) is not None]
+    top, reserve = _select(entries, RECOMMEND_TOP)
+    for entry in top:
+        if "score" not in entry and scores and entry["outfit_id"] in scores:
+            entry.update(scores[entry["outfit_id"]])
+    pending = [e for e in top if "score" not in e]
+    return top, reserve[:RECOMMEND_RESERVE], pending
+
+
+def _fill(doc, entries, wardrobe, priority):
+    top, reserve, pending = _split(entries, wardrobe)
+    if pending:
+        _score(pending, wardrobe, doc["context"], priority)
+    doc["outfits"] = sorted(top, key=lambda e: e["score"], reverse=True)
+    doc["reserve"] = reserve
+    return doc
+
+
+def _apply(key, change, wardrobe, priority, attempts=5):
+    """
+    Read-modify-write one context document. The write only lands if no
+    other worker updated the document in between; otherwise retry.
+
+    change maps the stored entries to the new ones, or to None when there
+    is nothing to do, and must not call the LLM. Outfits that enter the top
+    list are scored between reads, never between a read and its write, and
+    their scores are kept across retries, so a conflict only repeats the merge.
+    """
+    scores = {}
+    conflicts = 0
+    while conflicts < attempts:
+        doc = recommendations.find_one({"_id": key})
+        if doc is None:
+            return None
+        revision = doc.get("revision", 0)
+        entries = change(doc["outfits"] + doc["reserve"])
+        if entries is None:
+            return doc
+
+        top, reserve, pending = _split(entries, wardrobe, scores)
+        if pending:
+            _score(pending, wardrobe, doc["context"], priority)
+            scores.update({e["outfit_id"]: {f: e[f] for f in score_fields} for e in pending})
+            # The document may have changed while the LLM was scoring.
+            continue
+
+        doc["outfits"] = sorted(top, key=lambda e: e["score"], reverse=True)
+        doc["reserve"] = reserve
+        doc["revision"] = revision + 1
+        doc["updated_at"] = time.time()
+        if recommendations.replace_one({"_id": key, "revision": revision}, doc).matched_count:
+            return doc
+        conflicts += 1
+    raise RuntimeError(f"Recommendations for {key} kept changing, giving up")
+
+
+def _slot_of(item):
+    for slot, items in categorize([item]).items():
+        if items:
+            return slot
+    return None
+
+
+def _add_to(key, context, item_id, slot, wardrobe, priority):
+    """Search only outfits containing the item and merge them into one context."""
+    slots = _slots(wardrobe, context)
+    slots[slot] = [i for i in slots[slot] if i["_id"] == item_id]
+    outfits = search_outfits(
+        slots,
+        limit=RECOMMEND_TOP,
+        max_per_item=MAX_PER_ITEM,
+        optional=OPTIONAL_SLOTS - {slot},
+    )
+    candidates = [_entry(o, context) for o in outfits]
+
+    def change(entries):
+        # A retried job finds its item already folded in.
+        if any(item_id in e["ids"].values() for e in entries):
+            return None
+        return entries + [dict(c) for c in candidates]
+
+    return _apply(key, change, wardrobe, priority)
+
+
+def _remove_from(key, item_id, wardrobe, priority):
+    def change(entries):
+        kept = [e for e in entries if item_id not in e["ids"].values()]
+        if len(kept) == len(entries):
+            return None
+        return kept
+
+    return _apply(key, change, wardrobe, priority)
+
+
+def build_context(context, user=DEFAULT_USER, priority=BULK):
+    """
+    Compute and store the top outfits for one context from the whole
+    wardrobe. Only the RECOMMEND_TOP best by local fit are scored by the LLM.
+    """
+    key = context_key(context, user)
+    wardrobe = _wardrobe()
+    outfits = search_outfits(
+        _slots(wardrobe, context),
+        limit=RECOMMEND_TOP + RECOMMEND_RESERVE,
+        max_per_item=MAX_PER_ITEM,
+    )
+    existing = recommendations.find_one({"_id": key}, {"hits": 1, "last_used": 1, "revision": 1}) or {}
+    doc = {
+        "_id": key,
+        "user": user,
+        "context": context,
+        "hits": existing.get("hits", 0),
+        "last_used": existing.get("last_used", time.time()),
+        "revision": existing.get("revision", 0) + 1,
+        "built_at": time.time(),
+        "updated_at": time.time(),
+    }
+    _fill(doc, [_entry(o, context) for o in outfits], wardrobe, priority)
+    recommendations.replace_one({"_id": key}, doc, upsert=True)
+
+    # Items added or removed while the LLM was scoring missed the snapshot,
+    # and their incremental updates may have run before this write.
+    current = _wardrobe()
+    for item_id in current.keys() - wardrobe.keys():
+        slot = _slot_of(current[item_id])
+        if slot:
+            doc = _add_to(key, context, item_id, slot, current, priority) or doc
+    for item_id in wardrobe.keys() - current.keys():
+        doc = _remove_from(key, item_id, current, priority) or doc
+
+    print(f"Built recommendations for {key}: {len(doc['outfits'])} outfits")
+    return doc
+
+
+def missing_common_contexts(user=DEFAULT_USER):
+    """Common contexts with no stored document yet."""
+    keys = {context_key(c, user): c for c in common_contexts}
+    stored = {doc["_id"] for doc in recommendations.find({"_id": {"$in": list(keys)}}, {"_id": 1})}
+    return [context for key, context in keys.items() if key not in stored]
+
+
+def prune_contexts(user=DEFAULT_USER):
+    """
+    Drop contexts unused for RECOMMEND_CONTEXT_TTL, then all but the
+    RECOMMEND_MAX_CONTEXTS most requested, so each item change fans out to
+    a bounded set. The common contexts are always kept.
+
+    Returns:
+        int: Number of contexts dropped
+    """
+    pinned = {context_key(c, user) for c in common_contexts}
+    cutoff = time.time() - RECOMMEND_CONTEXT_TTL
+    docs = list(recommendations.find({"user": user}, {"hits": 1, "last_used": 1}))
+    recent = [d for d in docs if d["_id"] not in pinned and d.get("last_used", 0) >= cutoff]
+    recent.sort(key=lambda d: (d.get("hits", 0), d.get("last_used", 0)), reverse=True)
+    kept = pinned | {d["_id"] for d in recent[:RECOMMEND_MAX_CONTEXTS]}
+    dropped = [d["_id"] for d in docs if d["_id"] not in kept]
+    if dropped:
+        recommendations.delete_many({"_id": {"$in": dropped}})
+        print(f"Dropped {len(dropped)} unused recommendation contexts")
+    return len(dropped)
+
+
+def add_item(item_id, user=DEFAULT_USER, priority=BULK):
+    """
+    Fold a new item into every stored context. Only outfits that contain
+    the item are searched and scored; the rest of each list is kept.
+
+    Returns:
+        int: Number of contexts updated
+    """
+    wardrobe = _wardrobe()
+    item = wardrobe.get(item_id)
+    slot = _slot_of(item) if item else None
+    if slot is None:
+        return 0
+
+    prune_contexts(user)
+    updated = 0
+    for doc in recommendations.find({"user": user}, {"context": 1}):
+        _add_to(doc["_id"], doc["context"], item_id, slot, wardrobe, priority)
+        updated += 1
+    return updated
+
+
+def remove_item(item_id, user=DEFAULT_USER, priority=BULK):
+    """
+    Drop outfits containing a removed item from every stored context and
+    refill from the reserve. A context whose reserve runs out is rebuilt.
+
+    Returns:
+        int: Number of contexts updated
+    """
+    query = {"user": user, "$or": [
+        {f"{field}.ids.{slot}": item_id}
+        for field in ["outfits", "reserve"]
+        for slot in SLOTS
+    ]}
+    docs = list(recommendations.find(query, {"context": 1}))
+    wardrobe = _wardrobe() if docs else None
+    for doc in docs:
+        doc = _remove_from(doc["_id"], item_id, wardrobe, priority)
+        if doc is not None and len(doc["outfits"]) < RECOMMEND_TOP and not doc["reserve"]:
+            build_context(doc["context"], user, priority)
+    return len(docs)
+
+
+def refresh_item(item_id, user=DEFAULT_USER, priority=BULK):
+    """Re-score an edited item: drop its outfits, then fold it back in."""
+    remove_item(item_id, user, priority)
+    return add_item(item_id, user, priority)
+
+
+def get_recommendations(occasion=None, weather=None, style_pref=None, user=DEFAULT_USER, limit=RECOMMEND_TOP):
+    """
+    Top outfits for a context. Stored contexts are served straight from
+    the collection. An unseen context is computed live at interactive
+    priority and stored, so the next request for it is served directly.
+
+    Returns:
+        dict: "context", "source" ("materialized" or "live") and "outfits",
+        best first, each with its items, score and reason
+    """
+    context = normalize_context(occasion, weather, style_pref)
+    key = context_key(context, user)
+
+    doc = recommendations.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"hits": 1}, "$set": {"last_used": time.time()}},
+    )
+    source = "materialized"
+    if doc is None:
+        doc = build_context(context, user, priority=INTERACTIVE)
+        recommendations.update_one({"_id": key}, {"$inc": {"hits": 1}, "$set": {"last_used": time.time()}})
+        prune_contexts(user)
+        source = "live"
+
+    entries = doc["outfits"][:limit]
+    items = get_items_by_ids([i for e in entries for i in e["ids"].values() if i])
+    outfits = [o for o in (_hydrate(e, items) for e in entries) if o is not None]
+    return {"context": context, "source": source, "outfits": outfits, "updated_at": doc.get("updated_at")}
+
+
+def rebuild_all(user=DEFAULT_USER):
+    """Rebuild the common contexts and every context still maintained."""
+    prune_contexts(user)
+    contexts = {context_key(c, user): c for c in common_contexts}
+    for doc in recommendations.find({"user": user}, {"context": 1}):
+        contexts[doc["_id"]] = doc["context"]
+    for context in contexts.values():
+        build_context(context, user)
+    return len(contexts)
+
+
+if __name__ == "__main__":
+    print(f"Rebuilt {rebuild_all()} contexts")
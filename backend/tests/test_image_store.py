@@ -0,0 +1,65 @@
+import os
+import hashlib
+
+import pytest
+
+import image_store
+from image_store import LocalImageStore, key_for_name, is_key
+
+data = b"\xff\xd8\xff\xe0 not really a jpeg"
+digest = hashlib.sha256(data).hexdigest()
+
+
+def test_identical_bytes_are_stored_once_under_a_fanned_out_key(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    key = store.put(data, ".JPG")
+    assert key == f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+    assert is_key(key)
+    assert store.put(data, "jpg") == key
+
+    files = [os.path.join(d, f) for d, _, names in os.walk(tmp_path) for f in names]
+    assert files == [os.path.join(str(tmp_path), digest[:2], digest[2:4], f"{digest}.jpg")]
+    assert store.read(key) == data
+    assert store.exists(key)
+    assert store.local_path(key) == files[0]
+
+
+def test_writes_leave_no_temporary_files(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    for i in range(5):
+        store.put(data + bytes([i]), ".png")
+    names = [f for _, _, files in os.walk(tmp_path) for f in files]
+    assert len(names) == 5
+    assert not [n for n in names if n.startswith(".tmp-")]
+
+
+def test_ref_for_name_rejects_names_outside_the_legacy_directory(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    for name in ["../secrets.txt", "../../etc/passwd", "sub/dir.jpg", ".env"]:
+        assert store.ref_for_name(name) is None
+    assert store.ref_for_name(f"{digest}.jpg") == key_for_name(f"{digest}.jpg")
+    assert store.ref_for_name("photo.jpg") == os.path.join(image_store.LEGACY_IMAGE_DIR, "photo.jpg")
+
+
+def test_s3_store_against_moto(tmp_path, monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    for name, value in [("AWS_ACCESS_KEY_ID", "test"), ("AWS_SECRET_ACCESS_KEY", "test"), ("AWS_DEFAULT_REGION", "us-east-1")]:
+        monkeypatch.setenv(name, value)
+
+    with moto.mock_aws():
+        boto3.client("s3").create_bucket(Bucket="images")
+        store = image_store.S3ImageStore("images", prefix="wardrobe", cache_dir=str(tmp_path))
+
+        key = store.put(data, ".jpg")
+        assert store.put(data, ".jpg") == key
+        listed = boto3.client("s3").list_objects_v2(Bucket="images")["Contents"]
+        assert [o["Key"] for o in listed] == [f"wardrobe/{key}"]
+
+        assert store.exists(key)
+        assert not store.exists(key_for_name("0" * 64 + ".jpg"))
+        assert store.read(key) == data
+        path = store.local_path(key)
+        assert path.startswith(str(tmp_path))
+        with open(path, "rb") as f:
+            assert f.read() == data
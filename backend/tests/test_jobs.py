@@ -0,0 +1,49 @@
+import threading
+
+from jobs import JobQueue, run_worker, handlers
+from llm_scheduler import Overloaded
+
+
+def test_shed_job_is_deferred_without_using_an_attempt(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=1)
+    job_id = queue.enqueue("shed", {})
+    stop = threading.Event()
+
+    def shed(payload):
+        stop.set()
+        raise Overloaded("LLM queue is full", retry_after=30)
+
+    handlers["shed"] = shed
+    try:
+        run_worker(queue, stop=stop, poll=0.01)
+    finally:
+        del handlers["shed"]
+
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert job["run_after"] > job["updated_at"] + 25
+
+
+def test_recover_fails_jobs_out_of_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease=0.0, max_attempts=2, backoff=0.0)
+    spent = queue.enqueue("tag", {})
+    retried = queue.enqueue("tag", {})
+    queue.claim("w1")
+    queue.fail(spent, "boom")
+    queue.claim("w1")
+    queue.claim("w1")
+
+    assert queue.recover() == 1
+    assert queue.get(spent)["status"] == "failed"
+    assert queue.get(retried)["status"] == "queued"
+
+
+def test_uploads_are_claimed_before_recommendation_upkeep(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    upkeep = queue.enqueue("recommendations", {"action": "add", "item_id": "a"})
+    upload = queue.enqueue("tag", {"image_path": "x.jpg"})
+
+    assert queue.claim("w1")["id"] == upload
+    assert queue.claim("w1", kinds=["tag"]) is None
+    assert queue.claim("w1", kinds=["recommendations"])["id"] == upkeep
@@ -0,0 +1,175 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from llm_pool import Backend, BackendPool, NoBackendAvailable
+
+
+class FakeServer:
+    """A stand-in llama.cpp server with switchable health and status codes."""
+
+    def __init__(self, name, slots=1, delay=0.0):
+        self.name = name
+        self.slots = slots
+        self.delay = delay
+        self.healthy = True
+        self.status = 200
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send(200 if server.healthy else 503, {"status": "ok" if server.healthy else "error"})
+                elif self.path == "/props":
+                    self._send(200, {"total_slots": server.slots})
+                else:
+                    self._send(404, {})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server.lock:
+                    server.calls += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                time.sleep(server.delay)
+                with server.lock:
+                    server.in_flight -= 1
+                self._send(server.status, {"server": server.name})
+
+        return Handler
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(*args, **kwargs):
+        server = FakeServer(*args, **kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
+
+
+def make_pool(*servers, **kwargs):
+    pool = BackendPool([Backend(s.url) for s in servers], health_interval=3600, **kwargs)
+    pool.start()
+    return pool
+
+
+def test_slots_are_read_from_props(servers):
+    pool = make_pool(servers("a", slots=3))
+    assert pool.capacity() == 3
+
+
+def test_dispatches_to_least_loaded_backend(servers):
+    fast = servers("fast")
+    slow = servers("slow")
+    pool = make_pool(fast, slow)
+    pool.backends[0].latency = 0.1
+    pool.backends[1].latency = 2.0
+
+    assert pool.chat({})["server"] == "fast"
+
+    # With the fast backend's only slot taken, the next call goes to the slow one.
+    held = pool.acquire("text")
+    assert held.url == fast.url
+    assert pool.chat({})["server"] == "slow"
+    pool.release(held)
+
+
+def test_never_exceeds_backend_slots(servers):
+    server = servers("a", slots=2, delay=0.1)
+    pool = make_pool(server)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda _: pool.chat({}), range(6)))
+
+    assert len(results) == 6
+    assert server.max_in_flight == 2
+
+
+def test_server_errors_eject_and_health_readmits(servers):
+    server = servers("a")
+    pool = make_pool(server, max_failures=2)
+
+    server.status = 500
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            pool.chat({})
+    assert not pool.backends[0].healthy
+    with pytest.raises(NoBackendAvailable):
+        pool.chat({})
+
+    server.status = 200
+    pool.check_health()
+    assert pool.backends[0].healthy
+    assert pool.chat({})["server"] == "a"
+
+
+def test_client_errors_do_not_eject(servers):
+    server = servers("a")
+    pool = make_pool(server, max_failures=2)
+
+    server.status = 400
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            pool.chat({})
+    assert pool.backends[0].healthy
+
+
+def test_failed_health_check_ejects(servers):
+    server = servers("a")
+    pool = make_pool(server)
+
+    server.healthy = False
+    pool.check_health()
+    assert not pool.backends[0].healthy
+
+    server.healthy = True
+    pool.check_health()
+    assert pool.backends[0].healthy
+
+
+def test_connection_error_retries_on_another_backend(servers):
+    live = servers("live")
+    dead = servers("dead")
+    pool = make_pool(live, dead)
+    dead.close()
+    # Make the dead backend look cheapest so it is tried first.
+    pool.backends[0].latency = 5.0
+    pool.backends[1].latency = 0.1
+
+    assert pool.chat({})["server"] == "live"
+    assert pool.backends[1].failures == 1
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from llm_scheduler import Scheduler, INTERACTIVE, BULK, QueueSaturated, DeadlineExceeded
+
+
+def start(scheduler, results, name, priority, gate):
+    def run():
+        try:
+            scheduler.run(gate.wait, priority=priority)
+            results[name] = "ok"
+        except Exception as e:
+            results[name] = type(e).__name__
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.05)
+    return thread
+
+
+def test_full_queue_sheds_bulk_before_interactive():
+    scheduler = Scheduler(lambda: 1, caps={INTERACTIVE: 1, BULK: 1}, max_queue=3)
+    gate = threading.Event()
+    results = {}
+    threads = [start(scheduler, results, "running", BULK, gate)]
+    for name, priority in [("bulk1", BULK), ("bulk2", BULK), ("interactive1", INTERACTIVE)]:
+        threads.append(start(scheduler, results, name, priority, gate))
+
+    threads.append(start(scheduler, results, "interactive2", INTERACTIVE, gate))
+    threads.append(start(scheduler, results, "bulk3", BULK, gate))
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results["interactive1"] == results["interactive2"] == "ok"
+    assert results["bulk2"] == "QueueSaturated"
+    assert results["bulk3"] == "QueueSaturated"
+    assert scheduler.metrics()["evicted"] == 1
+
+
+def test_full_queue_of_interactive_rejects_interactive():
+    scheduler = Scheduler(lambda: 1, caps={INTERACTIVE: 1, BULK: 1}, max_queue=1)
+    gate = threading.Event()
+    results = {}
+    threads = [start(scheduler, results, name, INTERACTIVE, gate) for name in ["running", "queued"]]
+    with pytest.raises(QueueSaturated):
+        scheduler.run(lambda: None, priority=INTERACTIVE)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_expected_wait_past_deadline_is_deadline_exceeded():
+    scheduler = Scheduler(lambda: 1)
+    scheduler.service_time = 100.0
+    gate = threading.Event()
+    thread = start(scheduler, {}, "running", INTERACTIVE, gate)
+    with pytest.raises(DeadlineExceeded):
+        scheduler.run(lambda: None, priority=INTERACTIVE, timeout=1)
+    gate.set()
+    thread.join()
+
+
+def test_offload_rejects_at_once_when_its_threads_are_busy():
+    scheduler = Scheduler(lambda: 1, caps={INTERACTIVE: 1, BULK: 1}, max_queue=1)
+    gate = threading.Event()
+
+    async def scenario():
+        # Bulk may use max_queue + the bulk cap, leaving a thread for interactive work.
+        bulk = [asyncio.ensure_future(scheduler.offload(gate.wait, priority=BULK)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueueSaturated):
+            await scheduler.offload(gate.wait, priority=BULK)
+        interactive = asyncio.ensure_future(scheduler.offload(gate.wait, priority=INTERACTIVE))
+        await asyncio.sleep(0.05)
+        start = time.monotonic()
+        with pytest.raises(QueueSaturated):
+            await scheduler.offload(gate.wait, priority=INTERACTIVE)
+        assert time.monotonic() - start < 0.5
+        gate.set()
+        return await asyncio.gather(*bulk, interactive)
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    assert scheduler.occupied == {INTERACTIVE: 0, BULK: 0}
@@ -0,0 +1,95 @@
+import time
+import random
+import itertools
+
+from outfit_search import SLOTS, NEUTRAL, search_outfits, build_tables, item_priors
+
+
+def wardrobe(counts, seed=0):
+    rng = random.Random(seed)
+    slots = {}
+    for slot, count in counts.items():
+        slots[slot] = [
+            {
+                "_id": f"{slot}{i}",
+                "formality_level": rng.randint(1, 5),
+                "seasons": rng.sample(["summer", "winter", "monsoon", "all"], 1),
+                "occasions": rng.sample(["office", "casual", "party", "date"], 2),
+                "style_tags": rng.sample(["minimal", "bold", "classic", "street"], 2),
+            }
+            for i in range(count)
+        ]
+    return slots
+
+
+def brute_force(slots, optional):
+    """Every outfit's score, computed the way search_outfits accumulates it."""
+    tables = build_tables(slots)
+    priors = {slot: item_priors(slots.get(slot) or []) for slot in SLOTS}
+    choices = [
+        list(range(len(slots.get(slot) or []))) + ([-1] if slot in optional else [])
+        for slot in SLOTS
+    ]
+    scores = []
+    for combo in itertools.product(*choices):
+        total = 0.0
+        for depth, (slot, j) in enumerate(zip(SLOTS, combo)):
+            if j < 0:
+                total += NEUTRAL * (depth + 1)
+                continue
+            total += float(priors[slot][j])
+            for prev_depth, prev in enumerate(SLOTS[:depth]):
+                i = combo[prev_depth]
+                total += float(tables[(prev, slot)][i, j]) if i >= 0 else NEUTRAL
+        scores.append(total)
+    terms = len(SLOTS) + len(SLOTS) * (len(SLOTS) - 1) // 2
+    return sorted((s / terms for s in scores), reverse=True)
+
+
+def test_empty_outerwear_still_yields_outfits():
+    slots = wardrobe({"top": 3, "bottom": 3, "shoes": 2, "outerwear": 0})
+    outfits = search_outfits(slots, limit=5)
+    assert len(outfits) == 5
+    assert all(o["outerwear"] is None for o in outfits)
+
+
+def test_missing_required_slot_returns_nothing():
+    slots = wardrobe({"top": 3, "bottom": 0, "shoes": 2, "outerwear": 2})
+    assert search_outfits(slots, limit=5) == []
+
+
+def test_max_per_item_spreads_items_across_outfits():
+    slots = wardrobe({"top": 8, "bottom": 8, "shoes": 8, "outerwear": 0})
+    outfits = search_outfits(slots, limit=6, max_per_item=2)
+    assert len(outfits) == 6
+    for slot in ["top", "bottom", "shoes"]:
+        ids = [o[slot]["_id"] for o in outfits]
+        assert max(ids.count(i) for i in ids) <= 2
+
+
+def test_fills_up_when_there_are_too_few_tops_for_diversity():
+    slots = wardrobe({"top": 1, "bottom": 5, "shoes": 2, "outerwear": 1})
+    outfits = search_outfits(slots, limit=4, max_per_item=2)
+    assert len(outfits) == 4
+    assert {o["top"]["_id"] for o in outfits} == {"top0"}
+    assert len({o["outfit_id"] for o in outfits}) == 4
+
+
+def test_beam_matches_brute_force_on_a_small_wardrobe():
+    slots = wardrobe({"top": 4, "bottom": 3, "shoes": 2, "outerwear": 2}, seed=3)
+    expected = brute_force(slots, {"shoes", "outerwear"})
+
+    best = search_outfits(slots, limit=1)
+    assert best[0]["compatibility"] == round(expected[0], 4)
+
+    exhaustive = search_outfits(slots, limit=10, max_per_item=None, beam_width=len(expected))
+    assert [o["compatibility"] for o in exhaustive] == [round(s, 4) for s in expected[:10]]
+
+
+def test_scales_to_a_few_hundred_items_per_slot():
+    slots = wardrobe({slot: 300 for slot in SLOTS})
+    start = time.perf_counter()
+    outfits = search_outfits(slots, limit=10)
+    elapsed = time.perf_counter() - start
+    assert len(outfits) == 10
+    assert elapsed < 2.0
@@ -0,0 +1,114 @@
+import sys
+import types
+import random
+import importlib
+from datetime import date
+
+import pytest
+
+from outfit_search import SLOTS
+
+
+def fake_wardrobe(per_part=6, seed=0):
+    rng = random.Random(seed)
+    items = {}
+    for part in ["upper", "lower", "footwear", "outerwear"]:
+        for i in range(per_part):
+            item_id = f"{part}{i}"
+            items[item_id] = {
+                "_id": item_id,
+                "body_part": part,
+                "description": item_id,
+                "formality_level": rng.randint(1, 5),
+                "seasons": ["all"],
+                "occasions": rng.sample(["office", "casual", "party"], 2),
+                "style_tags": rng.sample(["minimal", "bold", "classic"], 1),
+            }
+    return items
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    items = fake_wardrobe()
+    searches = []
+
+    def get_style_candidates(query, body_part=None, limit=30):
+        searches.append(body_part)
+        return [{"id": i, "_score": 1.0} for i, item in items.items() if item["body_part"] == body_part][:limit]
+
+    database = types.ModuleType("database")
+    database.get_items_by_ids = lambda ids: {i: items[i] for i in ids if i in items}
+    database.save_item_to_db = lambda *args: None
+    v_database = types.ModuleType("v_database")
+    v_database.get_style_candidates = get_style_candidates
+    v_database.save_to_marqo = lambda **kwargs: None
+    monkeypatch.setitem(sys.modules, "database", database)
+    monkeypatch.setitem(sys.modules, "v_database", v_database)
+    for name in ["planner", "processor"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    module = importlib.import_module("planner")
+    module.searches = searches
+    return module
+
+
+def item_ids(day):
+    return [day["outfit"][slot]["_id"] for slot in SLOTS if day["outfit"][slot]]
+
+
+def test_undated_days_keep_their_order(planner):
+    days = [{"occasion": f"day{i}"} for i in range(12)]
+    order = planner._day_order(days)
+    assert order == list(range(12))
+
+
+def test_dated_days_sort_by_date_not_text(planner):
+    days = [{"date": "2026-10-23"}, {"date": "2026-10-5"}, {"date": "2026-10-19"}, {"occasion": "any"}]
+    # "2026-10-5" is not an ISO date and sorts with the undated days.
+    assert planner._day_order(days) == [2, 0, 1, 3]
+
+
+def test_no_outfit_repeats_and_items_rest_for_the_rotation_gap(planner):
+    days = [{"date": d, "occasion": "office"} for d in ["2026-10-23", "2026-10-19", "2026-10-21"]]
+    result = planner.plan_outfits(days, rotation_gap=3)
+
+    plan = result["days"]
+    assert [d["date"] for d in plan] == ["2026-10-19", "2026-10-21", "2026-10-23"]
+    assert len({d["outfit_id"] for d in plan}) == len(plan)
+
+    # Mon/Wed/Fri: consecutive plan days are two calendar days apart, inside
+    # the gap of 3, while Monday and Friday are four apart.
+    worn = [set(item_ids(d)) for d in plan]
+    for a in range(len(plan)):
+        for b in range(a + 1, len(plan)):
+            apart = (date.fromisoformat(plan[b]["date"]) - date.fromisoformat(plan[a]["date"])).days
+            if apart < 3:
+                assert not worn[a] & worn[b]
+
+
+def test_rotation_gap_counts_calendar_days(planner):
+    shortlist = [
+        {"top": {"_id": "a"}, "bottom": {"_id": f"b{i}"}, "shoes": None, "outerwear": None}
+        for i in range(3)
+    ] + [{"top": {"_id": "z"}, "bottom": {"_id": "y"}, "shoes": None, "outerwear": None}]
+    scores = [[1.0, 1.0, 1.0, 0.1]] * 3
+
+    # Two days apart, a gap of 2 allows wearing top "a" every time.
+    dated = [{"date": d} for d in ["2026-10-19", "2026-10-21", "2026-10-23"]]
+    assigned = planner._assign(dated, shortlist, scores, 2)
+    assert all(shortlist[o]["top"]["_id"] == "a" for o in assigned.values())
+
+    # Consecutive positions without dates are one day apart.
+    assigned = planner._assign([{}, {}, {}], shortlist, scores, 2)
+    assert [shortlist[assigned[d]]["top"]["_id"] for d in range(3)] == ["a", "z", "a"]
+
+
+def test_search_count_does_not_grow_with_days(planner):
+    counts = []
+    for n in [1, 4, 10]:
+        days = [{"occasion": "casual" if i % 2 else "office"} for i in range(n)]
+        result = planner.plan_outfits(days)
+        assert len(result["days"]) == n
+        counts.append(result["searches"])
+    assert counts[0] == counts[1] == counts[2]
+    assert len(planner.searches) == 3 * counts[0]
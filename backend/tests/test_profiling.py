@@ -0,0 +1,64 @@
+import time
+import asyncio
+import threading
+
+import profiling
+
+
+def spin(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def unrelated_work(stop):
+    while not stop.is_set():
+        spin(0.01)
+
+
+def request_work():
+    spin(0.2)
+    return "done"
+
+
+def functions(sampler):
+    return {f for stack in sampler.stacks for _, f in stack}
+
+
+def test_samples_only_the_request_threads():
+    stop = threading.Event()
+    background = threading.Thread(target=unrelated_work, args=(stop,), daemon=True)
+    background.start()
+    sampler = profiling.Sampler(interval=0.002).start()
+
+    async def handle():
+        with sampler.activate():
+            return await profiling.run_in_threadpool(request_work)
+
+    try:
+        assert asyncio.run(handle()) == "done"
+    finally:
+        sampler.stop()
+        stop.set()
+
+    assert "request_work" in functions(sampler)
+    assert "unrelated_work" not in functions(sampler)
+    assert not sampler.threads
+
+
+def test_run_in_threadpool_without_a_profile():
+    assert asyncio.run(profiling.run_in_threadpool(request_work)) == "done"
+
+
+def test_event_loop_samples_are_marked_shared():
+    sampler = profiling.Sampler(interval=0.002).start()
+    try:
+        with sampler.track(shared=True):
+            request_work()
+    finally:
+        sampler.stop()
+
+    assert sampler.stacks
+    assert all(stack[0] == profiling.shared_root for stack in sampler.stacks)
+    assert sampler.breakdown()["shared_samples"] == sum(sampler.stacks.values())
+    assert not sampler.shared
@@ -3,10 +3,11 @@ import base64
 from PIL import Image
 import pillow_heif
 import os
+from image_store import store
 
 def encode_image(img_path):
-    with open(img_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+    """Base64 of an image given its store key or (legacy) filesystem path."""
+    return base64.b64encode(store.read(img_path)).decode("utf-8")
 
 def string_to_json(json_string):
     if not isinstance(json_string, str):
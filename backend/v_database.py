@@ -1,4 +1,5 @@
 import marqo
+from image_store import store
 
 mq = marqo.Client(url="http://localhost:8882")
 
@@ -13,7 +14,7 @@ def save_to_marqo(id, description, img_path, seasons, occasions, style_tags, bod
     doc = {
         "id": str(id),  # Ensure ID is a string
         "description": description,
-        "image": f"file://{img_path}",
+        "image": store.url(img_path),
         "seasons": seasons,
         "occasions": occasions,
         "style_tags": style_tags,
@@ -25,12 +26,15 @@ def save_to_marqo(id, description, img_path, seasons, occasions, style_tags, bod
             tensor_fields=["description", "image", "seasons", "occasions", "style_tags", "body_part"]  # Include both text and image fields for vectorization
         )
         print("Marqo index result:", result)
+        # Search results change with the index, so cached responses must too.
+        from database import bump_wardrobe_version
+        bump_wardrobe_version()
         return result
     except Exception as e:
         print(f"Error adding to Marqo: {str(e)}")
         raise
 
-def get_style_candidates(query, limit=5):
+def get_style_candidates(query, body_part=None, limit=5):
     """
     Search for clothing items matching the query, optionally filtered by body part.
     
@@ -43,14 +47,13 @@ def get_style_candidates(query, limit=5):
         list: List of matching items with their scores and metadata
     """
     # Add body part filter if specified
-    body_parts = ["upper", "lower", "footwear", "outerwear"]
+    body_parts = [body_part] if body_part else ["upper", "lower", "footwear", "outerwear"]
 
     all_results = []
     
-    for body_part in body_parts:
-        query = f"{query} for body_part:{body_part}"
+    for part in body_parts:
         results = mq.index("wardrobe-index").search(
-            q=query,
+            q=f"{query} for body_part:{part}",
             searchable_attributes=["description", "style_tags", "occasions", "body_part"],
             limit=limit
         )
@@ -59,6 +62,16 @@ def get_style_candidates(query, limit=5):
     return all_results
 
 
+def delete_from_marqo(id, index_name="wardrobe-index"):
+    try:
+        result = mq.index(index_name).delete_documents(ids=[str(id)])
+        from database import bump_wardrobe_version
+        bump_wardrobe_version()
+        return result
+    except Exception as e:
+        print(f"Error deleting from Marqo: {str(e)}")
+        raise
+
 def delete_index(index_name="wardrobe-index"):
     try:
         result = mq.delete_index(index_name)
@@ -1,6 +1,8 @@
-import { ClothingItem, getImageUrl } from "@/lib/api";
+import { useEffect, useRef, useState } from "react";
+import { ClothingItem, getImageUrl, streamExplanation } from "@/lib/api";
 import { cn } from "@/lib/utils";
-import { Star } from "lucide-react";
+import { Button } from "@/components/ui/button";
+import { Loader2, Sparkles, Star } from "lucide-react";
 
 interface OutfitDisplayProps {
   outfit: {
@@ -10,6 +12,7 @@ interface OutfitDisplayProps {
     outerwear?: ClothingItem;
     score: number;
     reason?: string;
+    outfit_id?: string;
   };
   className?: string;
 }
@@ -47,6 +50,28 @@ const OutfitItem = ({ item, label }: { item?: ClothingItem; label: string }) =>
 };
 
 const OutfitDisplay = ({ outfit, className }: OutfitDisplayProps) => {
+  const [explanation, setExplanation] = useState("");
+  const [isExplaining, setIsExplaining] = useState(false);
+  const stopStream = useRef<(() => void) | null>(null);
+
+  useEffect(() => {
+    setExplanation("");
+    setIsExplaining(false);
+    return () => stopStream.current?.();
+  }, [outfit.outfit_id]);
+
+  const handleExplain = () => {
+    if (!outfit.outfit_id) return;
+    setExplanation("");
+    setIsExplaining(true);
+    stopStream.current = streamExplanation(
+      outfit.outfit_id,
+      (text) => setExplanation((prev) => prev + text),
+      () => setIsExplaining(false),
+      () => setIsExplaining(false)
+    );
+  };
+
   return (
     <div className={cn("space-y-8", className)}>
       {/* Score */}
@@ -78,6 +103,32 @@ const OutfitDisplay = ({ outfit, className }: OutfitDisplayProps) => {
           </div>
         </div>
       )}
+
+      {/* Stylist explanation, generated on demand */}
+      {outfit.outfit_id && (
+        <div className="max-w-2xl mx-auto text-center space-y-4">
+          {!explanation && (
+            <Button variant="outline" onClick={handleExplain} disabled={isExplaining}>
+              {isExplaining ? (
+                <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+              ) : (
+                <Sparkles className="w-4 h-4 mr-2" />
+              )}
+              Explain this outfit
+            </Button>
+          )}
+          {explanation && (
+            <div className="glass-card rounded-xl p-6 text-left">
+              <h4 className="font-serif text-lg font-semibold text-foreground mb-2">
+                Stylist notes
+              </h4>
+              <p className="text-muted-foreground leading-relaxed whitespace-pre-line">
+                {explanation}
+              </p>
+            </div>
+          )}
+        </div>
+      )}
     </div>
   );
 };
@@ -18,6 +18,24 @@ export interface UploadResponse {
   filename: string;
   file_path: string;
   converted_from_heic: boolean;
+  job_id: string;
+  multi: boolean;
+}
+
+export interface JobStatus {
+  job_id: string;
+  kind: string;
+  status: "queued" | "running" | "done" | "failed";
+  attempts: number;
+  max_attempts: number;
+  error: string | null;
+  // Single uploads return item; multi-garment uploads return items
+  result: {
+    item_id?: string;
+    item?: ClothingItem;
+    item_ids?: string[];
+    items?: ClothingItem[];
+  } | null;
 }
 
 export interface AnalyzeResponse {
@@ -48,18 +66,20 @@ export interface OutfitResult {
     outerwear?: ClothingItem;
     score: number;
     reason?: string;
+    outfit_id?: string;
   };
   total_combinations: number;
   score: number;
   reason: string;
+  source?: "materialized" | "live";
 }
 
-// Upload a file
-export async function uploadFile(file: File): Promise<UploadResponse> {
+// Upload a file. With multi, the photo is split into one item per garment.
+export async function uploadFile(file: File, multi = false): Promise<UploadResponse> {
   const formData = new FormData();
   formData.append("file", file);
 
-  const response = await fetch(`${API_BASE_URL}/upload/`, {
+  const response = await fetch(`${API_BASE_URL}/upload/${multi ? "?multi=true" : ""}`, {
     method: "POST",
     body: formData,
   });
@@ -72,6 +92,28 @@ export async function uploadFile(file: File): Promise<UploadResponse> {
   return response.json();
 }
 
+// Get the status of a background job
+export async function getJob(jobId: string): Promise<JobStatus> {
+  const response = await fetch(`${API_BASE_URL}/jobs/${encodeURIComponent(jobId)}`);
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || "Failed to fetch job status");
+  }
+
+  return response.json();
+}
+
+// Poll a background job until it finishes or fails
+export async function waitForJob(jobId: string, intervalMs = 1500): Promise<JobStatus> {
+  while (true) {
+    const job = await getJob(jobId);
+    if (job.status === "done") return job;
+    if (job.status === "failed") throw new Error(job.error || "Job failed");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 // Analyze clothing from image path
 export async function analyzeClothing(imagePath: string): Promise<AnalyzeResponse> {
   const response = await fetch(`${API_BASE_URL}/analyze/clothing/?image_path=${encodeURIComponent(imagePath)}`, {
@@ -178,6 +220,52 @@ export async function getBestOutfit(
   return response.json();
 }
 
+// Get precomputed outfit recommendations for a context from the whole wardrobe
+export async function getRecommendation(
+  occasion?: string | null,
+  weather?: string | null,
+  stylePref?: string | null
+): Promise<OutfitResult> {
+  const params = new URLSearchParams();
+  if (occasion) params.append("occasion", occasion);
+  if (weather) params.append("weather", weather);
+  if (stylePref) params.append("style_pref", stylePref);
+
+  const response = await fetch(`${API_BASE_URL}/outfits/recommend?${params.toString()}`);
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || "Failed to get outfit recommendation");
+  }
+
+  return response.json();
+}
+
+// Stream a stylist explanation for an outfit, calling onDelta for each text chunk
+export function streamExplanation(
+  outfitId: string,
+  onDelta: (text: string) => void,
+  onDone?: () => void,
+  onError?: (error: Error) => void
+): () => void {
+  const source = new EventSource(`${API_BASE_URL}/outfits/${encodeURIComponent(outfitId)}/explain`);
+
+  source.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    if (data.delta) onDelta(data.delta);
+  };
+  source.addEventListener("done", () => {
+    source.close();
+    onDone?.();
+  });
+  source.onerror = () => {
+    source.close();
+    onError?.(new Error("Failed to stream outfit explanation"));
+  };
+
+  return () => source.close();
+}
+
 // Get image URL
 export function getImageUrl(filename: string): string {
   return `${API_BASE_URL}/api/images/${filename}`;
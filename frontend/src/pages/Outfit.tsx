@@ -6,6 +6,7 @@ import {
   searchStyleCandidates,
   extractPreferences,
   getBestOutfit,
+  getRecommendation,
   OutfitResult,
 } from "@/lib/api";
 import { toast } from "sonner";
@@ -21,15 +22,26 @@ const Outfit = () => {
     setResult(null);
 
     try {
-      // Step 1: Search for style candidates and extract preferences in parallel
+      // Step 1: Start the style search while extracting preferences
       setSearchStage("Searching your wardrobe...");
-      const [candidatesResult, preferencesResult] = await Promise.all([
-        searchStyleCandidates(query),
-        extractPreferences(query),
-      ]);
+      const candidatesRequest = searchStyleCandidates(query).catch(() => ({ results: [] }));
+      const { preferences } = await extractPreferences(query);
 
-      const { results: candidates } = candidatesResult;
-      const { preferences } = preferencesResult;
+      // Most queries map to a context the server has already precomputed
+      try {
+        const recommendation = await getRecommendation(
+          preferences.occasion,
+          preferences.weather,
+          preferences.style_pref
+        );
+        setResult(recommendation);
+        toast.success("Found the perfect outfit for you!");
+        return;
+      } catch (error) {
+        console.error("Recommendation failed, scoring search results instead:", error);
+      }
+
+      const { results: candidates } = await candidatesRequest;
 
       if (!candidates || candidates.length === 0) {
         toast.error("No matching items found in your wardrobe. Try uploading more clothes!");
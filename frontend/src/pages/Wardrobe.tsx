@@ -4,11 +4,12 @@ import UploadZone from "@/components/wardrobe/UploadZone";
 import ProcessingStatus, { ProcessingStep } from "@/components/wardrobe/ProcessingStatus";
 import WardrobeGrid from "@/components/wardrobe/WardrobeGrid";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
+import { Switch } from "@/components/ui/switch";
+import { Label } from "@/components/ui/label";
 import {
   uploadFile,
-  analyzeClothing,
-  saveItemToMongoDB,
-  saveItemToMarqo,
+  waitForJob,
+  getImageUrl,
   ClothingItem,
 } from "@/lib/api";
 import { toast } from "sonner";
@@ -23,6 +24,7 @@ const Wardrobe = () => {
   const [items, setItems] = useState<ClothingItem[]>([]);
   const [processingFiles, setProcessingFiles] = useState<ProcessingFile[]>([]);
   const [isProcessing, setIsProcessing] = useState(false);
+  const [multiGarment, setMultiGarment] = useState(false);
 
   const updateFileStatus = (index: number, step: ProcessingStep, error?: string) => {
     setProcessingFiles((prev) =>
@@ -30,42 +32,31 @@ const Wardrobe = () => {
     );
   };
 
-  const processFile = async (file: File, index: number) => {
+  const processFile = async (file: File, index: number, multi: boolean) => {
     try {
       // Step 1: Upload
       updateFileStatus(index, "uploading");
-      const uploadResult = await uploadFile(file);
+      const uploadResult = await uploadFile(file, multi);
 
-      // Step 2: Analyze
+      // Step 2: Tagging and indexing run as a background job on the server
       updateFileStatus(index, "analyzing");
-      const analysisResult = await analyzeClothing(uploadResult.file_path);
-
-      // Step 3: Save to MongoDB
-      updateFileStatus(index, "saving-mongo");
-      const mongoResult = await saveItemToMongoDB(analysisResult);
-
-      // Step 4: Save to Marqo
-      updateFileStatus(index, "saving-marqo");
-      await saveItemToMarqo(
-        analysisResult.image_path,
-        analysisResult.description || `${analysisResult.color} ${analysisResult.category} ${analysisResult.style}`
-      );
+      const job = await waitForJob(uploadResult.job_id);
 
       // Complete
       updateFileStatus(index, "complete");
 
       // Add to items list
-      const newItem: ClothingItem = {
-        _id: mongoResult.item_id,
-        ...analysisResult,
-      };
-      setItems((prev) => [newItem, ...prev]);
+      const newItems: ClothingItem[] =
+        job.result?.items ?? (job.result?.item ? [job.result.item] : []);
+      if (newItems.length > 0) {
+        setItems((prev) => [...newItems, ...prev]);
+      }
 
-      return true;
+      return newItems.length;
     } catch (error) {
       const errorMessage = error instanceof Error ? error.message : "Unknown error";
       updateFileStatus(index, "error", errorMessage);
-      return false;
+      return 0;
     }
   };
 
@@ -81,20 +72,19 @@ const Wardrobe = () => {
     }));
     setProcessingFiles(initialProcessingFiles);
 
-    // Process files sequentially to avoid overwhelming the server
-    let successCount = 0;
-    for (let i = 0; i < files.length; i++) {
-      const success = await processFile(files[i], i);
-      if (success) successCount++;
-    }
+    // Uploads return as soon as the file is stored; the server queues the
+    // tagging work, so all files can be in flight at once
+    const results = await Promise.all(files.map((file, i) => processFile(file, i, multiGarment)));
+    const successCount = results.filter(Boolean).length;
+    const itemCount = results.reduce((sum, count) => sum + count, 0);
 
     setIsProcessing(false);
 
     // Show summary toast
     if (successCount === files.length) {
-      toast.success(`Successfully added ${successCount} items to your wardrobe!`);
+      toast.success(`Successfully added ${itemCount} items to your wardrobe!`);
     } else if (successCount > 0) {
-      toast.warning(`Added ${successCount} of ${files.length} items. Some failed.`);
+      toast.warning(`Added ${itemCount} items from ${successCount} of ${files.length} photos. Some failed.`);
     } else {
       toast.error("Failed to add items to your wardrobe.");
     }
@@ -103,7 +93,7 @@ const Wardrobe = () => {
     setTimeout(() => {
       setProcessingFiles([]);
     }, 3000);
-  }, []);
+  }, [multiGarment]);
 
   return (
     <div className="min-h-screen bg-background">
@@ -135,6 +125,17 @@ const Wardrobe = () => {
               {/* Upload Zone */}
               <div className="max-w-2xl mx-auto animate-slide-up">
                 <h2 className="text-2xl font-semibold mb-4">Upload New Items</h2>
+                <div className="flex items-center gap-3 mb-4">
+                  <Switch
+                    id="multi-garment"
+                    checked={multiGarment}
+                    onCheckedChange={setMultiGarment}
+                    disabled={isProcessing}
+                  />
+                  <Label htmlFor="multi-garment">
+                    Photos contain several garments (flat-lay or full outfit)
+                  </Label>
+                </div>
                 <UploadZone onFilesSelected={handleFilesSelected} isProcessing={isProcessing} />
               </div>
 
@@ -160,7 +161,7 @@ const Wardrobe = () => {
                       >
                         <div className="aspect-square overflow-hidden rounded-lg border">
                           <img
-                            src={item.image_path}
+                            src={getImageUrl(item.image_path?.split("/").pop() || "")}
                             alt={item.description || 'Clothing item'}
                             className="h-full w-full object-cover"
                           />